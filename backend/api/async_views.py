@@ -0,0 +1,111 @@
+"""Асинхронные обработчики горячих эндпоинтов чтения для ASGI-режима.
+
+В Django 3.2 нет асинхронного ORM: запросы к БД выполняются
+в ограниченном пуле потоков, число потоков (и соединений с БД)
+на воркер не превышает ASYNC_DB_THREADS.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+
+from api.views import IngredientsViewSet, RecipesViewSet, TagsViewSet
+from recipes.models import Ingredient, Tag
+
+try:
+    from api.renderers import dumps
+except ImportError:
+    dumps = None
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS,
+    thread_name_prefix='async-db')
+
+
+def _call_with_connections(func, *args, **kwargs):
+    # Потоки пула живут долго: соединения переиспользуются
+    # в пределах CONN_MAX_AGE, как между запросами в WSGI.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """Выполнить синхронный код в пуле потоков.
+
+    Контекст (маршрутизация на реплики) передаётся в поток.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor,
+        partial(context.run, _call_with_connections, func, *args, **kwargs))
+
+
+async def fetch_all(queryset):
+    """Выполнить запрос и вернуть список объектов."""
+    return await run_sync(list, queryset)
+
+
+def pooled(view):
+    """Асинхронная обёртка над DRF-представлением.
+
+    Представление и рендеринг ответа выполняются в пуле потоков.
+    """
+    async def async_view(request, *args, **kwargs):
+        response = await run_sync(view, request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            await run_sync(response.render)
+        return response
+
+    # csrf_exempt из Django 3.2 делает обёртку синхронной.
+    async_view.csrf_exempt = True
+    return async_view
+
+
+recipe_list = pooled(
+    RecipesViewSet.as_view({'get': 'list', 'post': 'create'}))
+recipe_detail = pooled(RecipesViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy'}))
+_tag_list = pooled(
+    TagsViewSet.as_view({'get': 'list', 'post': 'create'}))
+_ingredient_list = pooled(
+    IngredientsViewSet.as_view({'get': 'list', 'post': 'create'}))
+
+
+def _json(data):
+    if dumps is not None:
+        return HttpResponse(dumps(data), content_type='application/json')
+    return JsonResponse(
+        data, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+async def tag_list(request):
+    """Список тегов без DRF: доступен всем, без пагинации."""
+    if request.method != 'GET':
+        return await _tag_list(request)
+    return _json(await fetch_all(
+        Tag.objects.values('id', 'name', 'color', 'slug')))
+
+
+async def ingredient_list(request):
+    """Список ингредиентов с поиском по началу названия."""
+    if request.method != 'GET':
+        return await _ingredient_list(request)
+    ingredients = Ingredient.objects.values('id', 'name', 'measurement_unit')
+    name = request.GET.get('name')
+    if name:
+        ingredients = ingredients.filter(name__istartswith=name)
+    return _json(await fetch_all(ingredients))
+
+
+tag_list.csrf_exempt = True
+ingredient_list.csrf_exempt = True
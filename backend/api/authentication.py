@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+
+def token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+def current_user_cache_key(user_id):
+    """Кэш ответа /api/users/me/."""
+    return f'users-me:{user_id}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя.
+
+    Кэш сбрасывается при выходе, смене пароля, деактивации
+    и удалении пользователя (см. api.signals).
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials, settings.AUTH_TOKEN_CACHE_TTL)
+        return credentials
@@ -0,0 +1,268 @@
+"""Потоковая выгрузка каталога в NDJSON и CSV для аналитики.
+
+Строки читаются курсором на стороне сервера (iterator) пачками по
+EXPORT_CHUNK_SIZE, связанные данные (теги и ингредиенты рецептов) -
+одним запросом на пачку. Память не зависит от объёма выгрузки.
+
+Выгрузка изменений (since) после строк отдаёт удаления из
+RecipeTombstone: строки {"id": ..., "deleted": ...}. Для таблиц, удаления
+из которых записываются не все (избранное, подписки), since не
+принимается - их выгружают целиком.
+"""
+import csv
+import io
+import json
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from foodgram.db_router import reset_routing, route_reads_to_replica
+from recipes.changes import is_expired
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTombstone, Subscribe)
+
+try:
+    from api.renderers import dumps
+except ImportError:
+    def dumps(data):
+        return json.dumps(data, cls=JSONEncoder).encode()
+
+_encoder = JSONEncoder()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_watermark(value):
+    """Водяной знак прошлой выгрузки (ISO 8601) -> datetime."""
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f'Неверный водяной знак: {value}')
+    if timezone.is_naive(moment):
+        return timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+def format_watermark(moment):
+    return moment.isoformat()
+
+
+class Dataset:
+    """Строки одной таблицы выгрузки.
+
+    С since выгружаются только строки, изменённые начиная с since и
+    до watermark, и удалённые за то же время; watermark передаётся
+    в since следующей выгрузки.
+    """
+
+    model = None
+    fields = ()
+    # Столбцы, которые добавляет expand.
+    extra_columns = ()
+    # Поле времени изменения строки; без него выгружается вся таблица.
+    changed_field = None
+    # Вид записей об удалении; если удаления записываются не все,
+    # выгрузка изменений пропустила бы строки, и since не принимается.
+    tombstone_kind = None
+
+    def __init__(self, since=None, chunk_size=None):
+        if since is not None and self.changed_field is not None:
+            if self.tombstone_kind is None:
+                raise ValueError(
+                    'Удаления из этой таблицы записываются не все, '
+                    'нужна полная выгрузка.')
+            if is_expired((since, 0)):
+                raise ValueError(
+                    'Записи об удалении старше водяного знака уже '
+                    'очищены (SYNC_TOMBSTONE_TTL), нужна полная выгрузка.')
+        self.since = since
+        # Строки читаются с реплики, а время изменения ставится до
+        # коммита: последние EXPORT_WATERMARK_DELAY секунд откладываются
+        # до следующей выгрузки, чтобы не пропустить строки, которые
+        # ещё не зафиксированы или не дошли до реплики.
+        self.watermark = timezone.now() - timedelta(
+            seconds=settings.EXPORT_WATERMARK_DELAY)
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        self.rows = 0
+
+    @property
+    def incremental(self):
+        return self.since is not None and self.changed_field is not None
+
+    @property
+    def columns(self):
+        columns = self.fields + self.extra_columns
+        if self.incremental:
+            return columns + ('deleted',)
+        return columns
+
+    def get_queryset(self):
+        queryset = self.model.objects.order_by('pk')
+        if self.changed_field is None:
+            return queryset
+        if self.since is not None:
+            queryset = queryset.filter(
+                **{f'{self.changed_field}__gte': self.since})
+        return queryset.filter(
+            **{f'{self.changed_field}__lt': self.watermark})
+
+    def chunks(self):
+        """Пачки строк (словарей) по chunk_size."""
+        rows = self.get_queryset().values(*self.fields).iterator(
+            chunk_size=self.chunk_size)
+        for chunk in chunked(rows, self.chunk_size):
+            self.expand(chunk)
+            self.rows += len(chunk)
+            yield chunk
+        if not self.incremental:
+            return
+        tombstones = RecipeTombstone.objects.filter(
+            kind=self.tombstone_kind, deleted__gte=self.since,
+            deleted__lt=self.watermark,
+        ).order_by('id').values_list('recipe_id', 'deleted').iterator(
+            chunk_size=self.chunk_size)
+        for chunk in chunked(tombstones, self.chunk_size):
+            self.rows += len(chunk)
+            yield [{'id': recipe_id, 'deleted': deleted}
+                   for recipe_id, deleted in chunk]
+
+    def expand(self, rows):
+        """Дополнить пачку связанными данными."""
+
+
+class RecipeDataset(Dataset):
+    model = Recipe
+    fields = ('id', 'author', 'name', 'text', 'cooking_time',
+              'pub_date', 'updated_at', 'image')
+    extra_columns = ('tags', 'ingredients')
+    changed_field = 'updated_at'
+    tombstone_kind = RecipeTombstone.RECIPE
+
+    def expand(self, rows):
+        by_id = {}
+        for row in rows:
+            row['image'] = (
+                default_storage.url(row['image']) if row['image'] else None)
+            row['tags'] = []
+            row['ingredients'] = []
+            by_id[row['id']] = row
+        tags = Recipe.tags.through.objects.filter(
+            recipe_id__in=by_id).values_list('recipe_id', 'tag__slug')
+        for recipe_id, slug in tags:
+            by_id[recipe_id]['tags'].append(slug)
+        ingredients = RecipeIngredient.objects.filter(
+            recipe_id__in=by_id).order_by('id').values_list(
+            'recipe_id', 'ingredient_id', 'amount')
+        for recipe_id, ingredient_id, amount in ingredients:
+            by_id[recipe_id]['ingredients'].append(
+                {'id': ingredient_id, 'amount': amount})
+
+
+class IngredientDataset(Dataset):
+    model = Ingredient
+    fields = ('id', 'name', 'measurement_unit')
+
+
+class FavoriteDataset(Dataset):
+    model = FavoriteRecipe
+    fields = ('id', 'user', 'recipe', 'created')
+    changed_field = 'created'
+
+
+class SubscriptionDataset(Dataset):
+    model = Subscribe
+    fields = ('id', 'user', 'author', 'created')
+    changed_field = 'created'
+
+
+DATASETS = {
+    'recipes': RecipeDataset,
+    'ingredients': IngredientDataset,
+    'favorites': FavoriteDataset,
+    'subscriptions': SubscriptionDataset,
+}
+
+
+def to_ndjson(dataset):
+    for rows in dataset.chunks():
+        yield b''.join(dumps(row) + b'\n' for row in rows)
+
+
+def csv_cell(value):
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode()
+    if isinstance(value, datetime):
+        # Как в NDJSON.
+        return _encoder.default(value)
+    return value
+
+
+def to_csv(dataset):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(dataset.columns)
+    for rows in dataset.chunks():
+        writer.writerows(
+            [csv_cell(row.get(column)) for column in dataset.columns]
+            for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if not dataset.rows:
+        yield buffer.getvalue().encode()
+
+
+FORMATS = {
+    'ndjson': (to_ndjson, 'application/x-ndjson'),
+    'csv': (to_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def gzip_stream(chunks, level=6):
+    """Сжимать поток gzip по мере выгрузки."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def on_replica(chunks):
+    """Читать данные потока с реплик.
+
+    Ответ отдаётся уже после выхода из ReplicaRoutingMiddleware,
+    поэтому маршрутизация включается на время каждого шага.
+    """
+    iterator = iter(chunks)
+    while True:
+        token = route_reads_to_replica(True)
+        try:
+            chunk = next(iterator, None)
+        finally:
+            reset_routing(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def spool(chunks):
+    """Записать поток во временный файл (на диске, не в памяти)."""
+    file = tempfile.TemporaryFile()
+    for chunk in chunks:
+        file.write(chunk)
+    file.seek(0)
+    return file
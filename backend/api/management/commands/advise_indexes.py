@@ -0,0 +1,132 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import IngredientsViewSet, RecipesViewSet, UsersViewSet
+from recipes.cart_totals import user_totals
+from recipes.models import Recipe, RecipeIngredient, Subscribe, Tag
+
+User = get_user_model()
+
+# Признаки плана, которые стоит закрыть индексом.
+WARNINGS = {
+    'postgresql': (
+        (re.compile(r'Seq Scan on (\w+)'), 'последовательное чтение {}'),
+        (re.compile(r'(?:^|->\s+)((?:Incremental )?Sort)\s+\('),
+         'сортировка ({})'),
+    ),
+    'sqlite': (
+        (re.compile(r'SCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)'),
+         'последовательное чтение {}'),
+        (re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)'),
+         'сортировка ({})'),
+    ),
+}
+
+
+def view_queryset(viewset, user, params=None):
+    """Запрос списка так, как его строит представление API."""
+
+    request = APIRequestFactory().get('/', params or {})
+    if user is not None:
+        force_authenticate(request, user)
+    view = viewset(
+        action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={})
+    view.request = view.initialize_request(request)
+    queryset = view.filter_queryset(view.get_queryset())
+    if view.paginator is None:
+        return queryset
+    return queryset[:view.paginator.page_size]
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN основных запросов API: последовательные чтения '
+            'и сортировки, которым нужен индекс')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя для запросов с авторизацией '
+                 '(по умолчанию - с наибольшим числом подписок)')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Печатать планы целиком')
+
+    def handle(self, *args, **options):
+        warnings = 0
+        for name, queryset in self.get_querysets(options['user']):
+            plan = self.explain(queryset)
+            found = self.find_warnings(plan)
+            warnings += len(found)
+            style = self.style.WARNING if found else self.style.SUCCESS
+            self.stdout.write(style(name))
+            for warning in found:
+                self.stdout.write(f'  ! {warning}')
+            if options['plans'] or found:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+        self.stdout.write(f'Замечаний: {warnings}')
+
+    def get_querysets(self, user_id):
+        if user_id:
+            user = User.objects.get(id=user_id)
+        else:
+            user = User.objects.annotate(
+                subscriptions=Count('follower')
+            ).order_by('-subscriptions', 'id').first()
+            if user is None:
+                raise CommandError('В базе нет пользователей.')
+        author = Recipe.objects.order_by().values('author').annotate(
+            count=Count('id')).order_by('-count').values('author')[:1]
+        author_id = author[0]['author'] if author else 0
+        tag = Tag.objects.first()
+        page = list(view_queryset(RecipesViewSet, user).values_list(
+            'id', flat=True))
+        return (
+            ('Рецепты, аноним', view_queryset(RecipesViewSet, None)),
+            ('Рецепты', view_queryset(RecipesViewSet, user)),
+            ('Рецепты автора', view_queryset(
+                RecipesViewSet, user, {'author': author_id})),
+            ('Рецепты по тегу', view_queryset(
+                RecipesViewSet, user, {'tags': tag.slug if tag else ''})),
+            ('Избранное', view_queryset(
+                RecipesViewSet, user, {'is_favorited': 1})),
+            ('Список покупок', view_queryset(
+                RecipesViewSet, user, {'is_in_shopping_cart': 1})),
+            ('Ингредиенты рецептов страницы',
+             RecipeIngredient.objects.filter(
+                 recipe__in=page).select_related('ingredient')),
+            ('Пользователи', view_queryset(UsersViewSet, user)),
+            ('Подписки пользователя',
+             Subscribe.objects.filter(user=user)[:6]),
+            ('Подписан ли на автора', Subscribe.objects.filter(
+                user=user, author__id=author_id)[:1]),
+            ('Рецепты автора в подписках',
+             Recipe.objects.filter(author=author_id)[:3]),
+            ('Число рецептов автора',
+             Recipe.objects.filter(author=author_id).order_by().values(
+                 'author').annotate(count=Count('id'))),
+            ('Скачивание списка покупок', user_totals(user)),
+            ('Поиск ингредиентов', view_queryset(
+                IngredientsViewSet, None, {'name': 'са'})),
+        )
+
+    @staticmethod
+    def explain(queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    @staticmethod
+    def find_warnings(plan):
+        found = []
+        for line in plan.splitlines():
+            for pattern, message in WARNINGS.get(connection.vendor, ()):
+                match = pattern.search(line)
+                if match:
+                    found.append(message.format(match.group(1)))
+        return found
@@ -0,0 +1,63 @@
+"""Список покупок в PDF.
+
+reportlab импортируется при первом построении документа
+(или заранее, при прогреве воркеров - foodgram.warmup).
+"""
+import io
+import os
+
+from django.conf import settings
+
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'DejaVuSans.ttf')
+
+_font_registered = False
+
+
+def register_font():
+    """Зарегистрировать шрифт с кириллицей (один раз на процесс)."""
+    global _font_registered
+    if _font_registered:
+        return
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    _font_registered = True
+
+
+def shopping_cart_pdf(items):
+    """Построить PDF со списком покупок.
+
+    items - строки user_totals(): название, количество, единица измерения.
+    """
+    from reportlab.pdfgen import canvas
+
+    register_font()
+    buffer = io.BytesIO()
+    # invariant: без даты создания и случайного ID, одинаковые списки
+    # дают одинаковые файлы (см. foodgram.downloads).
+    page = canvas.Canvas(buffer, invariant=True)
+    x_position, y_position = 50, 800
+    if not items:
+        page.setFont(FONT_NAME, 24)
+        page.drawString(x_position, y_position, 'Cписок покупок пуст!')
+        page.save()
+        return buffer.getvalue()
+    page.setFont(FONT_NAME, 14)
+    indent = 20
+    page.drawString(x_position, y_position, 'Cписок покупок:')
+    for index, item in enumerate(items, start=1):
+        page.drawString(
+            x_position, y_position - indent,
+            f'{index}. {item["ingredient__name"]} - '
+            f'{item["amount"]} '
+            f'{item["ingredient__measurement_unit"]}.')
+        y_position -= 15
+        if y_position <= 50:
+            page.showPage()
+            # После showPage шрифт сбрасывается на стандартный.
+            page.setFont(FONT_NAME, 14)
+            y_position = 800
+    page.save()
+    return buffer.getvalue()
@@ -0,0 +1,54 @@
+"""JSON через orjson.
+
+Подключаются в REST_FRAMEWORK, если orjson установлен; иначе
+используются стандартные JSONRenderer и JSONParser.
+"""
+import orjson
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+# Совпадает с JSONRenderer: строки U+2028/U+2029 экранируются.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """Сериализовать данные ответа в JSON (bytes).
+
+    Decimal, даты и ленивые строки преобразуются так же,
+    как в стандартном JSONRenderer.
+    """
+    content = orjson.dumps(
+        data, default=_encoder.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    for separator, escaped in LINE_SEPARATORS:
+        if separator in content:
+            content = content.replace(separator, escaped)
+    return content
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            # Форматированный вывод (browsable API) - стандартный рендерер.
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class ORJSONParser(parsers.JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
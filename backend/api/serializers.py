@@ -6,9 +6,11 @@ from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Subscribe, Tag
+from recipes.signals import recipe_saved
 
 User = get_user_model()
 ERR_MSG = 'Не удается войти в систему с предоставленными учетными данными.'
+BULK_MAX_RECIPES = 100
 
 
 class TokenSerializer(serializers.Serializer):
@@ -51,6 +53,11 @@ class GetIsSubscribedMixin:
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
+        # Список рецептов передает подписки пользователя в контексте,
+        # чтобы не делать запрос на каждую карточку.
+        subscribed = self.context.get('subscribed_authors')
+        if subscribed is not None:
+            return obj.id in subscribed
         return user.follower.filter(author=obj).exists()
 
 
@@ -58,12 +65,22 @@ class UserListSerializer(
         GetIsSubscribedMixin,
         serializers.ModelSerializer):
     is_subscribed = serializers.BooleanField(read_only=True)
+    followers_count = serializers.IntegerField(read_only=True)
+    following_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username',
-            'first_name', 'last_name', 'is_subscribed')
+            'first_name', 'last_name', 'is_subscribed',
+            'followers_count', 'following_count')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Счетчики подписок - только по запросу (?counts=true).
+        if not self.context.get('with_counts'):
+            self.fields.pop('followers_count')
+            self.fields.pop('following_count')
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -224,18 +241,26 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        recipe_saved.send(sender=Recipe, recipe=recipe, created=True)
         return recipe
 
     def update(self, instance, validated_data):
+        previous_ingredients = None
         if 'ingredients' in validated_data:
             ingredients = validated_data.pop('ingredients')
+            previous_ingredients = dict(instance.recipe.values_list(
+                'ingredient_id', 'amount'))
             instance.ingredients.clear()
             self.create_ingredients(ingredients, instance)
         if 'tags' in validated_data:
             instance.tags.set(
                 validated_data.pop('tags'))
-        return super().update(
+        instance = super().update(
             instance, validated_data)
+        recipe_saved.send(
+            sender=Recipe, recipe=instance, created=False,
+            previous_ingredients=previous_ingredients)
+        return instance
 
     def to_representation(self, instance):
         return RecipeReadSerializer(
@@ -266,6 +291,21 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = '__all__'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Набор полей из ?fields= / ?omit= (RecipesViewSet.requested_fields).
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in self.fields.keys() - fields:
+                self.fields.pop(name)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_RECIPES)
+
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
 
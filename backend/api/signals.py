@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import current_user_cache_key, token_cache_key
+from foodgram import events
+from recipes.models import Subscribe
+from recipes.signals import recipe_saved, recipes_imported
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Выход (djoser token/logout) и удаление пользователя."""
+    cache.delete(token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Смена пароля, деактивация и любые изменения пользователя."""
+    if created:
+        return
+    cache.delete_many([current_user_cache_key(instance.pk)] + [
+        token_cache_key(key) for key in Token.objects.filter(
+            user=instance).values_list('key', flat=True)])
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    cache.delete(current_user_cache_key(instance.pk))
+
+
+def publish_on_commit(messages):
+    """Отправить сообщения в поток событий после коммита транзакции."""
+
+    if not events.broker.enabled:
+        return
+
+    def publish():
+        for message in messages:
+            events.broker.publish(message)
+
+    transaction.on_commit(publish)
+
+
+@receiver(recipe_saved)
+def publish_new_recipe(sender, recipe, created, **kwargs):
+    """Уведомление подписчиков автора (foodgram.asgi, поток событий)."""
+    if created:
+        publish_on_commit([events.recipe_message(recipe)])
+
+
+@receiver(recipes_imported)
+def publish_imported_recipes(sender, recipes, **kwargs):
+    publish_on_commit([events.recipe_message(recipe) for recipe in recipes])
+
+
+@receiver(post_save, sender=Subscribe)
+def publish_follow(sender, instance, created, **kwargs):
+    if created:
+        publish_on_commit([events.follow_message(
+            instance.user_id, instance.author_id, True)])
+
+
+@receiver(post_delete, sender=Subscribe)
+def publish_unfollow(sender, instance, **kwargs):
+    publish_on_commit([events.follow_message(
+        instance.user_id, instance.author_id, False)])
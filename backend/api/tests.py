@@ -0,0 +1,87 @@
+import base64
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import FavoriteRecipe, Recipe
+from users.models import User
+
+CHANGES_URL = '/api/recipes/changes/'
+# Кэш в памяти, чтобы тесты не очищали кэш запущенных воркеров.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=TEST_CACHES, SYNC_OVERLAP_SECONDS=0)
+class RecipeChangesTests(TestCase):
+    """Синхронизация изменений для офлайн-клиентов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            password='password', first_name='reader', last_name='reader')
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.user, name=name, text=name, cooking_time=10)
+
+    def changes(self, token=None):
+        response = self.client.get(
+            CHANGES_URL, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def recipe_ids(self, data):
+        return [recipe['id'] for recipe in data['recipes']]
+
+    def test_round_tripped_token(self):
+        old = self.create_recipe('old')
+        first = self.changes()
+        self.assertEqual(self.recipe_ids(first), [old.id])
+        new = self.create_recipe('new')
+        second = self.changes(first['token'])
+        self.assertEqual(self.recipe_ids(second), [new.id])
+        self.assertEqual(self.recipe_ids(self.changes(second['token'])), [])
+
+    @override_settings(SYNC_CHANGES_LIMIT=1)
+    def test_token_pages_through_changes(self):
+        created = [self.create_recipe(f'recipe {number}').id
+                   for number in range(3)]
+        data, pages = self.changes(), []
+        pages.append(self.recipe_ids(data))
+        while data['has_more']:
+            data = self.changes(data['token'])
+            pages.append(self.recipe_ids(data))
+        self.assertEqual(pages, [[recipe_id] for recipe_id in created])
+
+    def test_removed_favorite_in_removed(self):
+        recipe = self.create_recipe('favorite')
+        kept = self.create_recipe('kept')
+        FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+        FavoriteRecipe.objects.create(user=self.user, recipe=kept)
+        token = self.changes()['token']
+        response = self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        favorites = self.changes(token)['favorites']
+        self.assertEqual(favorites['removed'], [recipe.id])
+        self.assertEqual(favorites['added'], [])
+
+    def test_deleted_recipe_in_deleted(self):
+        recipe = self.create_recipe('deleted')
+        token = self.changes()['token']
+        recipe_id = recipe.id
+        recipe.delete()
+        self.assertEqual(self.changes(token)['deleted'], [recipe_id])
+
+    def test_malformed_token(self):
+        naive = base64.urlsafe_b64encode(
+            b'2026-01-01T00:00:00|0').decode()
+        for token in ('broken', naive):
+            response = self.client.get(CHANGES_URL, {'since': token})
+            self.assertEqual(response.status_code, 400)
@@ -0,0 +1,155 @@
+"""Ограничение частоты запросов без внешнего хранилища.
+
+Корзины токенов (token bucket) лежат в файле, отображенном в память
+(mmap) и общем для всех воркеров gunicorn на машине. Слот выбирается
+по хэшу "scope:клиент"; на время обновления слота его байты блокируются
+через fcntl. Проверка - несколько микросекунд, без запросов к БД и кэшу.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+# Слот: хэш ключа, остаток токенов, время последнего обновления.
+SLOT = struct.Struct('<Qdd')
+# Ключ ищется в окне из PROBE соседних слотов; если его нет, занимается
+# пустой слот или слот, который дольше всех не обновлялся.
+PROBE = 4
+
+
+class BucketStore:
+    """Таблица корзин токенов в разделяемой памяти."""
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.windows = max(slots // PROBE, 1)
+        self.size = self.windows * PROBE * SLOT.size
+        self.pid = None
+        self.fd = None
+        self.memory = None
+        self.lock = threading.Lock()
+        # В воркере после fork lock мог остаться занятым потоком мастера.
+        os.register_at_fork(after_in_child=self.reset_lock)
+
+    def reset_lock(self):
+        self.lock = threading.Lock()
+
+    def open(self):
+        # Файл открывается в каждом процессе заново:
+        # fcntl-блокировки принадлежат процессу.
+        if self.memory is not None:
+            self.memory.close()
+            os.close(self.fd)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self.fd = fd
+        self.memory = mmap.mmap(fd, self.size)
+        self.pid = os.getpid()
+
+    def consume(self, key, capacity, duration):
+        """Взять токен из корзины key.
+
+        Возвращает (разрешено, сколько секунд ждать следующего токена).
+        """
+        digest = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(),
+            'little') or 1
+        start = digest % self.windows * PROBE * SLOT.size
+        rate = capacity / duration
+        with self.lock:
+            if self.pid != os.getpid():
+                self.open()
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, PROBE * SLOT.size, start)
+            try:
+                now = time.time()
+                offset, tokens, updated = self.find_slot(digest, start)
+                if offset is None:
+                    offset, tokens = self.evict(start), capacity
+                else:
+                    tokens = min(
+                        capacity, tokens + (now - updated) * rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                SLOT.pack_into(self.memory, offset, digest, tokens, now)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, PROBE * SLOT.size, start)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def find_slot(self, digest, start):
+        for offset in range(start, start + PROBE * SLOT.size, SLOT.size):
+            stored, tokens, updated = SLOT.unpack_from(self.memory, offset)
+            if stored == digest:
+                return offset, tokens, updated
+        return None, None, None
+
+    def evict(self, start):
+        return min(
+            range(start, start + PROBE * SLOT.size, SLOT.size),
+            key=lambda offset: SLOT.unpack_from(self.memory, offset)[2])
+
+
+store = BucketStore(settings.THROTTLE_STORE_PATH, settings.THROTTLE_SLOTS)
+
+
+class SharedBucketThrottle(SimpleRateThrottle):
+    """Корзина токенов на пользователя (аноним - на IP) в пределах scope.
+
+    Частота из DEFAULT_THROTTLE_RATES: "10/min" - корзина на 10 запросов,
+    которая пополняется равномерно за минуту.
+    """
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self.wait_seconds = store.consume(
+            key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class DownloadThrottle(SharedBucketThrottle):
+    scope = 'download'
+
+
+class RecipeWriteThrottle(SharedBucketThrottle):
+    scope = 'recipe_write'
+
+
+class RecipeImportThrottle(SharedBucketThrottle):
+    scope = 'recipe_import'
+
+
+class RecipeListThrottle(SharedBucketThrottle):
+    scope = 'recipe_list'
+
+
+class SubscribeThrottle(SharedBucketThrottle):
+    scope = 'subscribe'
+
+
+class LoginThrottle(SharedBucketThrottle):
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        # До входа пользователь анонимный: ограничиваем по IP.
+        return f'{self.scope}:{self.get_ident(request)}'
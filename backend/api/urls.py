@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (AddAndDeleteSubscribe, AddDeleteFavoriteRecipe,
-                       AddDeleteShoppingCart, AuthToken, IngredientsViewSet,
-                       RecipesViewSet, TagsViewSet, UsersViewSet, set_password)
+                       AddDeleteShoppingCart, AuthToken, BulkFavoriteRecipes,
+                       BulkShoppingCart, CatalogExport, IngredientsViewSet,
+                       RecipesViewSet, TagsViewSet, UsersViewSet,
+                       set_password)
 
 app_name = 'api'
 
@@ -35,7 +38,29 @@ urlpatterns = [
           'recipes/<int:recipe_id>/shopping_cart/',
           AddDeleteShoppingCart.as_view(),
           name='shopping_cart'),
+     path(
+          'recipes/favorite/bulk/',
+          BulkFavoriteRecipes.as_view(),
+          name='favorite_bulk'),
+     path(
+          'recipes/shopping_cart/bulk/',
+          BulkShoppingCart.as_view(),
+          name='shopping_cart_bulk'),
+     path(
+          'export/<slug:dataset>.<slug:export_format>',
+          CatalogExport.as_view(),
+          name='export'),
      path('', include(router.urls)),
      path('', include('djoser.urls')),
      path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from api import async_views
+
+    urlpatterns = [
+        path('tags/', async_views.tag_list),
+        path('ingredients/', async_views.ingredient_list),
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+    ] + urlpatterns
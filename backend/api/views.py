@@ -1,32 +1,53 @@
-import io
-
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.db.models.aggregates import Count, Sum
-from django.db.models.expressions import Exists, OuterRef, Value
-from django.http import FileResponse
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.aggregates import Count
+from django.db.models.expressions import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
 from djoser.views import UserViewSet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import generics, status, viewsets
+from rest_framework import generics, status, views, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import (SAFE_METHODS, AllowAny,
-                                        IsAuthenticated,
+                                        IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from api import export
+from api.authentication import current_user_cache_key
 from api.filters import IngredientFilter, RecipeFilter
+from api.pdf import shopping_cart_pdf
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrAdminOrReadOnly
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
-                            Subscribe, Tag)
+from api.throttling import (DownloadThrottle, LoginThrottle,
+                            RecipeImportThrottle, RecipeListThrottle,
+                            RecipeWriteThrottle, SubscribeThrottle)
+from foodgram.downloads import file_response
+from foodgram.middleware import accepted_encodings
+from recipes import changes, facets, pantry
+from recipes.cart_totals import user_totals
+from recipes.importer import RecipeImporter
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Subscribe, Tag)
+from recipes.signals import list_changes_reported, recipes_list_changed
+from recipes.similarity import similar_recipe_ids
+from recipes.timeline import decode_cursor, encode_cursor, read_feed
 from .pagination import LimitPageNumberPagination
-from .serializers import (IngredientSerializer, RecipeReadSerializer,
-                          RecipeWriteSerializer, SubscribeRecipeSerializer,
-                          SubscribeSerializer, TagSerializer, TokenSerializer,
+from .serializers import (IngredientSerializer, RecipeIdsSerializer,
+                          RecipeReadSerializer, RecipeUserSerializer,
+                          RecipeWriteSerializer,
+                          SubscribeRecipeSerializer, SubscribeSerializer,
+                          TagSerializer, TokenSerializer,
                           UserCreateSerializer, UserListSerializer,
                           UserPasswordSerializer)
 
@@ -34,6 +55,18 @@ User = get_user_model()
 FILENAME = 'shoppingcart.pdf'
 
 
+def subscriptions_count(field):
+    """Число подписок пользователя по индексированному полю Subscribe:
+    'author' - подписчики, 'user' - подписки."""
+
+    return Coalesce(Subquery(
+        Subscribe.objects.filter(
+            **{field: OuterRef('id')}
+        ).order_by().values(field).annotate(
+            count=Count('id')
+        ).values('count')), 0)
+
+
 class GetObjectMixin:
     """Миксина для удаления/добавления рецептов избранных/корзины."""
 
@@ -47,6 +80,93 @@ class GetObjectMixin:
         return recipe
 
 
+class RecipeListMixin:
+    """Миксина для пакетных операций с избранным/корзиной."""
+
+    list_model = None
+
+    def get_throttles(self):
+        if self.request.method in SAFE_METHODS:
+            return super().get_throttles()
+        return [RecipeListThrottle()]
+
+    def get_list_items(self, recipe_ids):
+        return self.list_model.objects.filter(
+            user=self.request.user, recipe_id__in=recipe_ids)
+
+    def get_present_ids(self, recipe_ids):
+        return set(self.get_list_items(
+            recipe_ids).values_list('recipe_id', flat=True))
+
+    def add_recipes(self, recipe_ids):
+        """Добавить рецепты одним INSERT, вернуть новые id."""
+
+        present = self.get_present_ids(recipe_ids)
+        added = [
+            recipe_id for recipe_id in recipe_ids
+            if recipe_id not in present]
+        self.list_model.objects.bulk_create(
+            [self.list_model(user=self.request.user, recipe_id=recipe_id)
+             for recipe_id in added],
+            ignore_conflicts=True)
+        self.send_changed(added, 'add')
+        return added
+
+    def remove_recipes(self, recipe_ids):
+        """Удалить рецепты одним DELETE, вернуть удаленные id."""
+
+        added = dict(self.get_list_items(
+            recipe_ids).values_list('recipe_id', 'created'))
+        removed = [
+            recipe_id for recipe_id in recipe_ids if recipe_id in added]
+        with list_changes_reported():
+            self.get_list_items(removed).delete()
+        self.send_changed(removed, 'remove', added=added)
+        return removed
+
+    def send_changed(self, recipe_ids, action, **kwargs):
+        if recipe_ids:
+            recipes_list_changed.send(
+                sender=self.list_model,
+                user=self.request.user,
+                recipe_ids=recipe_ids,
+                action=action,
+                **kwargs)
+
+
+class BulkRecipeListMixin(RecipeListMixin):
+    """Миксина для пакетного добавления/удаления рецептов."""
+
+    serializer_class = RecipeIdsSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_recipe_ids(self):
+        serializer = self.get_serializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
+
+    def post(self, request, *args, **kwargs):
+        recipe_ids = self.get_recipe_ids()
+        existing = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        added = set(self.add_recipes(
+            [recipe_id for recipe_id in recipe_ids if recipe_id in existing]))
+        return Response({'recipes': [
+            {'id': recipe_id,
+             'status': 'added' if recipe_id in added
+             else 'exists' if recipe_id in existing
+             else 'not_found'}
+            for recipe_id in recipe_ids]})
+
+    def delete(self, request, *args, **kwargs):
+        recipe_ids = self.get_recipe_ids()
+        removed = set(self.remove_recipes(recipe_ids))
+        return Response({'recipes': [
+            {'id': recipe_id,
+             'status': 'removed' if recipe_id in removed else 'not_found'}
+            for recipe_id in recipe_ids]})
+
+
 class PermissionAndPaginationMixin:
     """Миксина для списка тегов и ингридиентов."""
 
@@ -62,6 +182,11 @@ class AddAndDeleteSubscribe(
     serializer_class = SubscribeSerializer
     pagination_class = LimitPageNumberPagination
 
+    def get_throttles(self):
+        if self.request.method in SAFE_METHODS:
+            return super().get_throttles()
+        return [SubscribeThrottle()]
+
     def get_queryset(self):
         return self.request.user.follower.select_related(
             'following'
@@ -97,36 +222,99 @@ class AddAndDeleteSubscribe(
 
 class AddDeleteFavoriteRecipe(
         GetObjectMixin,
+        RecipeListMixin,
         generics.RetrieveDestroyAPIView,
         generics.ListCreateAPIView):
     """Добавление и удаление рецепта в/из избранных."""
 
+    list_model = FavoriteRecipe
+
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
-        request.user.favorite_recipe.recipe.add(instance)
+        self.add_recipes([instance.id])
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.favorite_recipe.recipe.remove(instance)
+        self.remove_recipes([instance.id])
 
 
 class AddDeleteShoppingCart(
         GetObjectMixin,
+        RecipeListMixin,
         generics.RetrieveDestroyAPIView,
         generics.ListCreateAPIView):
     """Добавление и удаление рецепта в/из корзины."""
 
     pagination_class = LimitPageNumberPagination
+    list_model = ShoppingCart
 
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
-        request.user.shopping_cart.recipe.add(instance)
+        self.add_recipes([instance.id])
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.shopping_cart.recipe.remove(instance)
+        self.remove_recipes([instance.id])
+
+
+class BulkFavoriteRecipes(
+        BulkRecipeListMixin,
+        generics.GenericAPIView):
+    """Пакетное добавление и удаление рецептов в/из избранных."""
+
+    list_model = FavoriteRecipe
+
+
+class BulkShoppingCart(
+        BulkRecipeListMixin,
+        generics.GenericAPIView):
+    """Пакетное добавление и удаление рецептов в/из корзины."""
+
+    list_model = ShoppingCart
+
+
+class CatalogExport(views.APIView):
+    """Потоковая выгрузка каталога для аналитики (NDJSON или CSV).
+
+    ?since= - водяной знак прошлой выгрузки из заголовка
+    X-Export-Watermark: только строки, изменённые и удалённые после него.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, dataset, export_format):
+        if (dataset not in export.DATASETS
+                or export_format not in export.FORMATS):
+            raise NotFound('Неизвестная выгрузка.')
+        since = request.query_params.get('since')
+        try:
+            since = export.parse_watermark(since) if since else None
+            rows = export.DATASETS[dataset](since)
+        except ValueError as error:
+            raise ValidationError({'since': str(error)})
+        encode, content_type = export.FORMATS[export_format]
+        content = export.on_replica(encode(rows))
+        compress = 'gzip' in accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if compress:
+            content = export.gzip_stream(content)
+        if settings.SERVER_MODE == 'asgi':
+            # ASGI-обработчик Django 3.2 читает поток в event loop,
+            # где запросы к БД запрещены: выгрузка идёт во временный файл.
+            response = FileResponse(export.spool(content))
+        else:
+            response = StreamingHttpResponse(content)
+        response['Content-Type'] = content_type
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = (
+            f'attachment; filename="{dataset}.{export_format}"')
+        response['X-Export-Watermark'] = export.format_watermark(
+            rows.watermark)
+        return response
 
 
 class AuthToken(ObtainAuthToken):
@@ -134,6 +322,7 @@ class AuthToken(ObtainAuthToken):
 
     serializer_class = TokenSerializer
     permission_classes = (AllowAny,)
+    throttle_classes = (LoginThrottle,)
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -152,21 +341,49 @@ class UsersViewSet(UserViewSet):
     permission_classes = (IsAuthenticated,)
     pagination_class = LimitPageNumberPagination
 
+    @cached_property
+    def with_counts(self):
+        return self.request.query_params.get(
+            'counts', '').lower() in ('1', 'true')
+
     def get_queryset(self):
-        return User.objects.annotate(
+        user = self.request.user
+        queryset = User.objects.annotate(
             is_subscribed=Exists(
-                self.request.user.follower.filter(
-                    author=OuterRef('id'))
-            )).prefetch_related(
-                'follower', 'following'
-        ) if self.request.user.is_authenticated else User.objects.annotate(
-            is_subscribed=Value(False))
+                user.follower.filter(author=OuterRef('id'))
+            ) if user.is_authenticated else Value(False))
+        if not self.with_counts:
+            return queryset
+        return queryset.annotate(
+            followers_count=subscriptions_count('author'),
+            following_count=subscriptions_count('user'))
 
     def get_serializer_class(self):
         if self.request.method.lower() == 'post':
             return UserCreateSerializer
         return UserListSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['with_counts'] = self.with_counts
+        return context
+
+    @action(['get', 'put', 'patch', 'delete'], detail=False)
+    def me(self, request, *args, **kwargs):
+        """Текущий пользователь: GET без счетчиков отдается из кэша."""
+
+        if request.method != 'GET':
+            return super().me(request, *args, **kwargs)
+        if self.with_counts:
+            return Response(self.get_serializer(
+                self.get_queryset().get(id=request.user.id)).data)
+        cache_key = current_user_cache_key(request.user.id)
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.get_serializer(request.user).data
+            cache.set(cache_key, data, settings.CURRENT_USER_CACHE_TTL)
+        return Response(data)
+
     def perform_create(self, serializer):
         password = make_password(self.request.data['password'])
         serializer.save(password=password)
@@ -193,29 +410,114 @@ class RecipesViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrAdminOrReadOnly, IsAuthenticatedOrReadOnly)
 
+    @property
+    def is_read(self):
+        """Запрос только читает рецепты (в том числе POST batch)."""
+        return self.request.method in SAFE_METHODS or self.action == 'batch'
+
     def get_serializer_class(self):
-        if self.request.method in SAFE_METHODS:
+        if self.is_read:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_throttles(self):
+        if self.is_read:
+            return super().get_throttles()
+        if self.action == 'import_recipes':
+            return [RecipeImportThrottle()]
+        return [RecipeWriteThrottle()]
+
+    @cached_property
+    def requested_fields(self):
+        """Поля рецепта из ?fields= и ?omit= (через запятую).
+
+        None - все поля. id возвращается всегда.
+        """
+        params = self.request.query_params
+        if not self.is_read or not ('fields' in params or 'omit' in params):
+            return None
+        requested = set(filter(None, params.get('fields', '').split(',')))
+        omitted = set(filter(None, params.get('omit', '').split(',')))
+        available = RecipeReadSerializer().fields.keys()
+        unknown = (requested | omitted) - available
+        if unknown:
+            raise ValidationError(
+                {'errors': f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+        return ((requested or set(available)) - omitted) | {'id'}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields
+        return context
+
+    def get_serializer(self, *args, **kwargs):
+        """Подписки пользователя читаются только на авторов
+        сериализуемых рецептов, а не весь список подписок."""
+
+        kwargs.setdefault('context', self.get_serializer_context())
+        fields = self.requested_fields
+        user = self.request.user
+        if (args and self.is_read and user.is_authenticated
+                and (fields is None or 'author' in fields)):
+            recipes = args[0] if kwargs.get('many') else [args[0]]
+            kwargs['context']['subscribed_authors'] = set(
+                user.follower.filter(
+                    author_id__in={recipe.author_id for recipe in recipes}
+                ).order_by().values_list('author_id', flat=True))
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        return Recipe.objects.annotate(
-            is_favorited=Exists(
-                FavoriteRecipe.objects.filter(
-                    user=self.request.user, recipe=OuterRef('id'))),
-            is_in_shopping_cart=Exists(
-                ShoppingCart.objects.filter(
-                    user=self.request.user,
-                    recipe=OuterRef('id')))
-        ).select_related('author').prefetch_related(
-            'tags', 'ingredients', 'recipe',
-            'shopping_cart', 'favorite_recipe'
-        ) if self.request.user.is_authenticated else Recipe.objects.annotate(
-            is_in_shopping_cart=Value(False),
-            is_favorited=Value(False),
-        ).select_related('author').prefetch_related(
-            'tags', 'ingredients', 'recipe',
-            'shopping_cart', 'favorite_recipe')
+        """Запрос под запрошенные поля: лишние колонки, аннотации
+        и prefetch не выполняются."""
+
+        fields = self.requested_fields
+        params = self.request.query_params
+        user = self.request.user
+
+        def wanted(name):
+            return fields is None or name in fields
+
+        queryset = Recipe.objects.all()
+        # Аннотации нужны и для одноименных фильтров RecipeFilter.
+        for name, list_model in (
+                ('is_favorited', FavoriteRecipe),
+                ('is_in_shopping_cart', ShoppingCart)):
+            if wanted(name) or name in params:
+                queryset = queryset.annotate(**{name: Exists(
+                    list_model.objects.filter(
+                        user=user, recipe=OuterRef('id'))
+                ) if user.is_authenticated else Value(False)})
+        if wanted('author'):
+            queryset = queryset.select_related('author')
+        if wanted('tags'):
+            queryset = queryset.prefetch_related('tags')
+        if wanted('ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')))
+        if fields is not None:
+            queryset = queryset.only(*self.get_columns(fields))
+        return queryset
+
+    @staticmethod
+    def get_columns(fields):
+        """Колонки Recipe (и автора) для запрошенных полей."""
+
+        columns = {'id'}
+        for name in fields:
+            try:
+                field = Recipe._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(name)
+        if 'author' in fields:
+            columns.update(
+                f'author__{name}'
+                for name in RecipeUserSerializer.Meta.fields
+                if name != 'is_subscribed')
+        return columns
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -224,45 +526,254 @@ class RecipesViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+
+        cursor = request.query_params.get('cursor')
+        position = decode_cursor(cursor) if cursor else None
+        if cursor and position is None:
+            return Response(
+                {'errors': 'Неверный курсор!'},
+                status=status.HTTP_400_BAD_REQUEST)
+        limit = self.paginator.get_page_size(request)
+        entries = read_feed(request.user, position, limit)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, recipe_id in entries])
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for _, recipe_id in entries
+             if recipe_id in recipes],
+            many=True)
+        next_url = None
+        if len(entries) == limit:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                'cursor', encode_cursor(*entries[-1]))
+        return Response({'next': next_url, 'results': serializer.data})
+
+    @action(
+        detail=False,
+        methods=['get', 'post'],
+        permission_classes=(AllowAny,))
+    def batch(self, request):
+        """Рецепты по списку id в порядке запроса.
+
+        GET ?ids=1,2,3 или POST {"recipes": [1, 2, 3]}, не больше
+        BULK_MAX_RECIPES. Ненайденные id возвращаются в missing.
+        """
+
+        data = request.data if request.method == 'POST' else {
+            'recipes': [
+                value for value in request.query_params.get(
+                    'ids', '').split(',') if value]}
+        ids_serializer = RecipeIdsSerializer(data=data)
+        ids_serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            ids_serializer.validated_data['recipes']))
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [
+                recipe_id for recipe_id in recipe_ids
+                if recipe_id not in recipes]})
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=(IsAdminUser,))
+    def import_recipes(self, request):
+        """Пакетный импорт рецептов из NDJSON в теле запроса.
+
+        Строки без author импортируются от имени администратора,
+        локальные изображения читаются из IMPORT_IMAGES_ROOT. Тело
+        больше IMPORT_MAX_BODY_SIZE - только командой import_recipes.
+        """
+
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = 0
+        if size > settings.IMPORT_MAX_BODY_SIZE:
+            return Response(
+                {'errors': 'Файл слишком большой, используйте команду '
+                           'import_recipes.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        report = RecipeImporter(request.user).run(request.stream or ())
+        return Response(
+            {'created': report.created,
+             'errors': [
+                 {'line': number, 'error': error}
+                 for number, error in report.errors],
+             'rows_per_second': round(report.rate)},
+            status=(status.HTTP_201_CREATED if report.created
+                    else status.HTTP_400_BAD_REQUEST))
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(AllowAny,))
+    def facets(self, request):
+        """Число рецептов по тегам и времени приготовления
+        при фильтрах списка (те же параметры, что у /api/recipes/)."""
+
+        params = request.query_params
+        filters = {
+            name: params.getlist(name)
+            for name in RecipeFilter.base_filters if name in params}
+        key = facets.cache_key(filters, request.user.id)
+        data = cache.get(key)
+        if data is None:
+            data = facets.count_facets(
+                self.filter_queryset(self.get_queryset()))
+            cache.set(key, data, settings.FACETS_CACHE_TTL)
+        return Response(data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='changes',
+        permission_classes=(AllowAny,))
+    def recipe_changes(self, request):
+        """Изменения рецептов после ?since= (token прошлого ответа).
+
+        Без since - все рецепты. Рецептов в ответе не больше
+        SYNC_CHANGES_LIMIT: пока has_more, запрашивать дальше с token.
+        Авторизованным - ещё изменения избранного и списка покупок.
+        """
+
+        started = timezone.now()
+        since = request.query_params.get('since')
+        position = changes.decode_token(since) if since else None
+        if since and position is None:
+            return Response(
+                {'errors': 'Неверный токен!'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if position is not None and changes.is_expired(position):
+            return Response(
+                {'errors': 'Токен устарел, нужна полная синхронизация.'},
+                status=status.HTTP_410_GONE)
+        limit = settings.SYNC_CHANGES_LIMIT
+        recipes = changes.changed_recipes(
+            self.get_queryset(), position, limit + 1)
+        has_more = len(recipes) > limit
+        recipes = recipes[:limit]
+        if has_more:
+            token = changes.encode_token(
+                recipes[-1].updated_at, recipes[-1].id)
+        else:
+            token = changes.next_token(started)
+        data = {
+            'token': token,
+            'has_more': has_more,
+            'recipes': self.get_serializer(recipes, many=True).data,
+            'deleted': changes.deleted_recipes(position)}
+        if request.user.is_authenticated:
+            data['favorites'] = changes.list_changes(
+                FavoriteRecipe, request.user, position)
+            data['shopping_cart'] = changes.list_changes(
+                ShoppingCart, request.user, position)
+        return Response(data)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=(AllowAny,))
+    def similar(self, request, pk=None):
+        """Похожие по ингредиентам рецепты из предрассчитанных соседей."""
+
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        similar_ids = similar_recipe_ids(recipe_id)
+        if not similar_ids:
+            get_object_or_404(Recipe, id=recipe_id)
+        recipes = self.get_queryset().in_bulk(similar_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in similar_ids
+             if recipe_id in recipes],
+            many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(AllowAny,))
+    def what_can_i_cook(self, request):
+        """Рецепты, для которых не хватает не больше max_missing продуктов."""
+
+        try:
+            ingredient_ids = [
+                int(value)
+                for values in request.query_params.getlist('ingredients')
+                for value in values.split(',') if value]
+            max_missing = int(request.query_params.get('max_missing', 0))
+        except ValueError:
+            ingredient_ids, max_missing = [], -1
+        if not ingredient_ids or not (
+                0 <= max_missing <= settings.PANTRY_MAX_MISSING):
+            return Response(
+                {'errors': 'Укажите id ингредиентов и max_missing '
+                           f'от 0 до {settings.PANTRY_MAX_MISSING}!'},
+                status=status.HTTP_400_BAD_REQUEST)
+        matches = self.paginate_queryset(pantry.index.search(
+            ingredient_ids, max_missing,
+            request.query_params.getlist('tags')))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches])
+        matches = [match for match in matches if match[0] in recipes]
+        results = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in matches],
+            many=True).data
+        for data, (_, missing, coverage) in zip(results, matches):
+            data['missing_ingredients'] = missing
+            data['coverage'] = round(coverage, 3)
+        return self.get_paginated_response(results)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(AllowAny,))
+    def trending(self, request):
+        """Популярные за неделю рецепты из предрассчитанного рейтинга."""
+
+        queryset = self.filter_queryset(
+            self.get_queryset().filter(
+                trending__isnull=False).order_by('trending__rank'))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='shopping_cart/summary',
+        permission_classes=(IsAuthenticated,))
+    def shopping_cart_summary(self, request):
+        """Итоговое количество ингредиентов в списке покупок."""
+
+        return Response([
+            {'id': row['ingredient_id'],
+             'name': row['ingredient__name'],
+             'measurement_unit': row['ingredient__measurement_unit'],
+             'amount': row['amount']}
+            for row in user_totals(request.user)])
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        throttle_classes=(DownloadThrottle,))
     def download_shopping_cart(self, request):
         """Создание списка покупок в pdf"""
 
-        buffer = io.BytesIO()
-        page = canvas.Canvas(buffer)
-        pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-        x_position, y_position = 50, 800
-        shopping_cart = (
-            request.user.shopping_cart.recipe.
-            values(
-                'ingredients__name',
-                'ingredients__measurement_unit'
-            ).annotate(amount=Sum('recipe__amount')).order_by())
-        page.setFont('DejaVuSans', 14)
-        if shopping_cart:
-            indent = 20
-            page.drawString(x_position, y_position, 'Cписок покупок:')
-            for index, recipe in enumerate(shopping_cart, start=1):
-                page.drawString(
-                    x_position, y_position - indent,
-                    f'{index}. {recipe["ingredients__name"]} - '
-                    f'{recipe["amount"]} '
-                    f'{recipe["ingredients__measurement_unit"]}.')
-                y_position -= 15
-                if y_position <= 50:
-                    page.showPage()
-                    y_position = 800
-            page.save()
-            buffer.seek(0)
-            return FileResponse(
-                buffer, as_attachment=True, filename=FILENAME)
-        page.setFont('DejaVuSans', 24)
-        page.drawString(
-            x_position,
-            y_position,
-            'Cписок покупок пуст!')
-        page.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename=FILENAME)
+        return file_response(
+            shopping_cart_pdf(user_totals(request.user)),
+            FILENAME, 'application/pdf')
 
 
 class TagsViewSet(
@@ -0,0 +1,121 @@
+"""Сравнение пропускной способности WSGI- и ASGI-режимов.
+
+Запускает gunicorn в каждом режиме с одинаковым числом воркеров
+и нагружает эндпоинты чтения параллельными запросами.
+
+    cd backend
+    python benchmarks/asgi_vs_wsgi.py --workers 2 --concurrency 64
+
+Нужны настроенная БД (переменные окружения как для manage.py),
+установленные gunicorn и uvicorn.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'wsgi': ['foodgram.wsgi:application'],
+    'asgi': [
+        'foodgram.asgi:application',
+        '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=20',
+    '/api/tags/',
+    '/api/ingredients/?name=%D1%81%D0%B0',
+)
+
+
+def start_server(mode, port, workers):
+    env = {**os.environ, 'SERVER_MODE': mode}
+    process = subprocess.Popen(
+        ['gunicorn', *MODES[mode],
+         '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers),
+         '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env)
+    url = f'http://127.0.0.1:{port}/api/tags/'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'Сервер в режиме {mode} не запустился.')
+
+
+def fetch(url, headers):
+    started = time.perf_counter()
+    request = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def load(base_url, paths, headers, concurrency, duration):
+    """Нагружать сервер duration секунд, вернуть задержки запросов."""
+    deadline = time.perf_counter() + duration
+
+    def worker(number):
+        latencies = []
+        index = number
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            latencies.append(fetch(base_url + path, headers))
+            index += 1
+        return latencies
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = pool.map(worker, range(concurrency))
+        return [latency for latencies in results for latency in latencies]
+
+
+def report(mode, latencies, duration):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f'{mode}: {len(latencies) / duration:8.1f} req/s, '
+        f'p50 {statistics.median(latencies) * 1000:6.1f} мс, '
+        f'p99 {p99 * 1000:6.1f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--token', help='токен для авторизованных запросов')
+    parser.add_argument('--path', action='append', dest='paths')
+    args = parser.parse_args()
+
+    headers = {}
+    if args.token:
+        headers['Authorization'] = f'Token {args.token}'
+    base_url = f'http://127.0.0.1:{args.port}'
+    paths = args.paths or DEFAULT_PATHS
+    for mode in MODES:
+        process = start_server(mode, args.port, args.workers)
+        try:
+            # Прогрев: соединения с БД, импорты, кэши.
+            load(base_url, paths, headers, args.concurrency, 1)
+            latencies = load(
+                base_url, paths, headers, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+        report(mode, latencies, args.duration)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
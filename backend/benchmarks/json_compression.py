@@ -0,0 +1,75 @@
+"""Время сериализации JSON и размер ответов основных эндпоинтов.
+
+Сравнивает стандартный JSONRenderer с ORJSONRenderer и размер тела
+без сжатия, с gzip и brotli (если установлен).
+
+    cd backend
+    python benchmarks/json_compression.py --token <токен>
+
+Нужна настроенная БД (переменные окружения как для manage.py).
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = (
+    '/api/ingredients/',
+    '/api/tags/',
+    '/api/recipes/',
+    '/api/recipes/?limit=50',
+    '/api/users/',
+)
+
+
+def setup_django():
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    import django
+
+    django.setup()
+
+
+def encode_time(renderer, data, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        renderer.render(data)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--token', help='токен для авторизованных запросов')
+    parser.add_argument('--path', action='append', dest='paths')
+    args = parser.parse_args()
+    setup_django()
+
+    from django.test import Client
+    from rest_framework.renderers import JSONRenderer
+
+    from api.renderers import ORJSONRenderer
+    from foodgram.middleware import COMPRESSORS
+
+    headers = {}
+    if args.token:
+        headers['HTTP_AUTHORIZATION'] = f'Token {args.token}'
+    client = Client(**headers)
+    renderers = {'json': JSONRenderer(), 'orjson': ORJSONRenderer()}
+    for path in args.paths or PATHS:
+        data = client.get(path).data
+        timings = ', '.join(
+            f'{name} {encode_time(renderer, data, args.repeat) * 1000:.2f} мс'
+            for name, renderer in renderers.items())
+        content = renderers['orjson'].render(data)
+        sizes = ', '.join(
+            f'{encoding} {len(compress(content))}'
+            for encoding, compress in COMPRESSORS.items())
+        print(f'{path}\n  кодирование: {timings}\n'
+              f'  байт: без сжатия {len(content)}, {sizes}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Время запуска gunicorn и задержка первых запросов к воркеру.
+
+Сравнивает запуск с предзагрузкой и прогревом (GUNICORN_PRELOAD=True)
+и без неё. Первый запрос к каждому адресу обслуживает свежий воркер.
+
+    cd backend
+    python benchmarks/startup.py --token <токен>
+
+Нужны настроенная БД (переменные окружения как для manage.py)
+и установленный gunicorn.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = (
+    '/api/recipes/',
+    '/api/ingredients/?name=%D1%81%D0%B0',
+)
+AUTH_PATHS = ('/api/recipes/download_shopping_cart/',)
+
+
+def fetch(url, headers):
+    started = time.perf_counter()
+    request = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def measure(preload, port, paths, headers, repeat):
+    env = {**os.environ, 'GUNICORN_PRELOAD': str(preload)}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        ['gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}',
+         '--workers', '1',
+         '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        while True:
+            try:
+                fetch(base_url + '/api/tags/', headers)
+                break
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError('gunicorn не запустился.')
+                time.sleep(0.02)
+        startup = time.perf_counter() - started
+        first = {path: fetch(base_url + path, headers) for path in paths}
+        steady = {
+            path: statistics.median(
+                fetch(base_url + path, headers) for _ in range(repeat))
+            for path in paths}
+    finally:
+        process.terminate()
+        process.wait()
+    return startup, first, steady
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument(
+        '--token', help='токен для скачивания списка покупок')
+    args = parser.parse_args()
+
+    headers, paths = {}, PATHS
+    if args.token:
+        headers['Authorization'] = f'Token {args.token}'
+        paths += AUTH_PATHS
+    for preload in (False, True):
+        startup, first, steady = measure(
+            preload, args.port, paths, headers, args.repeat)
+        print(f'preload={preload}: до первого ответа {startup:.2f} с')
+        for path in paths:
+            print(
+                f'  {path}: первый запрос {first[path] * 1000:7.1f} мс, '
+                f'далее {steady[path] * 1000:7.1f} мс')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
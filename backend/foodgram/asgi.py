@@ -1,7 +1,115 @@
+import asyncio
+import json
 import os
+from urllib.parse import parse_qs
 
 from django.core.asgi import get_asgi_application
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Модули с моделями импортируются после настройки Django.
+from django.conf import settings  # noqa: E402
+from rest_framework.exceptions import AuthenticationFailed  # noqa: E402
+
+from api.async_views import run_sync  # noqa: E402
+from api.authentication import CachedTokenAuthentication  # noqa: E402
+from foodgram import events  # noqa: E402
+from recipes.models import Subscribe  # noqa: E402
+
+EVENTS_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    # nginx не буферизует поток.
+    (b'x-accel-buffering', b'no'),
+]
+HEARTBEAT = b': ping\n\n'
+OVERFLOW = b'event: overflow\ndata: {}\n\n'
+
+
+def get_token(scope):
+    """Токен из заголовка Authorization или ?token= (для EventSource)."""
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token':
+                return key
+    query = parse_qs(scope.get('query_string', b'').decode())
+    return query.get('token', [None])[0]
+
+
+def token_user_id(key):
+    if not key:
+        return None
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user.id
+
+
+def followed_authors(user_id):
+    return list(Subscribe.objects.filter(
+        user_id=user_id).values_list('author_id', flat=True))
+
+
+def format_event(message):
+    recipe = message['recipe']
+    data = json.dumps(recipe, ensure_ascii=False, separators=(',', ':'))
+    return f'id: {recipe["id"]}\nevent: recipe\ndata: {data}\n\n'.encode()
+
+
+async def body(send, content, more_body=True):
+    await send({
+        'type': 'http.response.body',
+        'body': content,
+        'more_body': more_body})
+
+
+async def wait_disconnect(receive, connection):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    connection.close()
+
+
+async def events_stream(scope, receive, send):
+    """SSE: новые рецепты авторов, на которых подписан пользователь."""
+    user_id = await run_sync(token_user_id, get_token(scope))
+    if user_id is None:
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': [(b'content-type', b'application/json')]})
+        await body(send, json.dumps(
+            {'detail': 'Учетные данные не были предоставлены.'},
+            ensure_ascii=False).encode(), more_body=False)
+        return
+    connection = events.Connection(
+        user_id, await run_sync(followed_authors, user_id))
+    events.broker.connect(connection)
+    watcher = asyncio.ensure_future(wait_disconnect(receive, connection))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': EVENTS_HEADERS})
+        await body(send, f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode())
+        while not connection.closed:
+            if connection.overflowed:
+                await body(send, OVERFLOW, more_body=False)
+                break
+            if connection.pending:
+                await body(send, format_event(connection.pop()))
+            elif not await connection.wait(settings.EVENTS_HEARTBEAT):
+                await body(send, HEARTBEAT)
+    finally:
+        events.broker.disconnect(connection)
+        watcher.cancel()
+
+
+async def application(scope, receive, send):
+    if (scope['type'] == 'http' and scope['method'] == 'GET'
+            and scope['path'] == settings.EVENTS_PATH):
+        return await events_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
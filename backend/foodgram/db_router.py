@@ -0,0 +1,37 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DB = 'default'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def route_reads_to_replica(enabled):
+    """Разрешить/запретить чтение с реплик в текущем контексте."""
+    return _read_from_replica.set(enabled)
+
+
+def reset_routing(token):
+    _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение в безопасных запросах - с реплик, запись - в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        # Запросы с записью читают из основной БД целиком
+        # (foodgram.middleware.ReplicaRoutingMiddleware).
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
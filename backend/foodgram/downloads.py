@@ -0,0 +1,66 @@
+"""Отдача сгенерированных файлов через nginx (X-Accel-Redirect).
+
+Django проверяет права и пишет файл в закрытый каталог DOWNLOADS_ROOT,
+а передачу байтов клиенту выполняет nginx (internal location).
+Без USE_X_ACCEL_REDIRECT (разработка) файл отдаётся через FileResponse.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+
+def store(content, extension):
+    """Сохранить файл под именем из хэша содержимого.
+
+    Одинаковые файлы не перезаписываются, запись атомарная:
+    nginx не увидит недописанный файл.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    relative_path = os.path.join(digest[:2], digest + extension)
+    path = os.path.join(settings.DOWNLOADS_ROOT, relative_path)
+    if os.path.exists(path):
+        # Обновляем mtime, чтобы clean_downloads не удалил файл.
+        os.utime(path)
+        return relative_path
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(content)
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+    return relative_path
+
+
+def file_response(content, filename, content_type):
+    """Ответ с файлом-вложением."""
+    if not settings.USE_X_ACCEL_REDIRECT:
+        return FileResponse(
+            io.BytesIO(content), as_attachment=True, filename=filename,
+            content_type=content_type)
+    relative_path = store(content, os.path.splitext(filename)[1])
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = (
+        settings.DOWNLOADS_INTERNAL_URL + relative_path.replace(os.sep, '/'))
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def clean(max_age):
+    """Удалить файлы, к которым не обращались max_age секунд."""
+    deadline = time.time() - max_age
+    removed = 0
+    for directory, _, filenames in os.walk(settings.DOWNLOADS_ROOT):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
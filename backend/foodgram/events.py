@@ -0,0 +1,238 @@
+"""Сообщения для потока событий (SSE) о рецептах авторов из подписок.
+
+Брокер (EVENTS_BACKEND):
+- none - поток выключен, публикация ничего не делает (WSGI-режим);
+- local - раздача внутри процесса (разработка, тесты, один воркер);
+- postgres - NOTIFY при публикации, в каждом ASGI-воркере одно
+  соединение LISTEN раздаёт сообщения подключениям этого воркера.
+
+Подключение - объект со __slots__; очередь сообщений создаётся, только
+пока клиент не успевает их забирать, и ограничена EVENTS_QUEUE_SIZE.
+"""
+import asyncio
+import json
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+
+from foodgram.db_router import PRIMARY_DB
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+
+class Connection:
+    """Открытый поток событий пользователя."""
+
+    __slots__ = ('user_id', 'authors', 'pending', 'waiter', 'closed',
+                 'overflowed')
+
+    def __init__(self, user_id, authors):
+        self.user_id = user_id
+        self.authors = set(authors)
+        self.pending = None
+        self.waiter = None
+        self.closed = False
+        self.overflowed = False
+
+    def push(self, message):
+        if self.overflowed:
+            return
+        if self.pending is None:
+            self.pending = deque()
+        if len(self.pending) >= settings.EVENTS_QUEUE_SIZE:
+            # Клиент не успевает читать: поток закрывается, после
+            # переподключения клиент догоняет через /api/recipes/changes/.
+            self.overflowed = True
+            self.pending = None
+        else:
+            self.pending.append(message)
+        self.wake()
+
+    def pop(self):
+        if len(self.pending) == 1:
+            pending, self.pending = self.pending, None
+            return pending.popleft()
+        return self.pending.popleft()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self, timeout):
+        """Ждать сообщения не дольше timeout; False - если не дождались."""
+        self.waiter = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiter = None
+        return True
+
+
+class NullBroker:
+    """Поток событий выключен."""
+
+    enabled = False
+
+    def connect(self, connection):
+        pass
+
+    def disconnect(self, connection):
+        pass
+
+    def publish(self, message):
+        pass
+
+
+class LocalBroker:
+    """Раздача сообщений подключениям процесса."""
+
+    enabled = True
+
+    def __init__(self):
+        self.loop = None
+        self.by_author = {}
+        self.by_user = {}
+
+    def connect(self, connection):
+        self.loop = asyncio.get_running_loop()
+        self.by_user.setdefault(connection.user_id, set()).add(connection)
+        for author_id in connection.authors:
+            self.by_author.setdefault(author_id, set()).add(connection)
+
+    def disconnect(self, connection):
+        self.discard(self.by_user, connection.user_id, connection)
+        for author_id in connection.authors:
+            self.discard(self.by_author, author_id, connection)
+
+    @staticmethod
+    def discard(index, key, connection):
+        members = index.get(key)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del index[key]
+
+    def publish(self, message):
+        """Отправить сообщение; вызывается из любого потока."""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.dispatch, message)
+
+    def dispatch(self, message):
+        if message['event'] == 'recipe':
+            for connection in self.by_author.get(message['author'], ()):
+                connection.push(message)
+        elif message['event'] == 'follow':
+            self.follow(message['user'], message['author'], message['active'])
+
+    def follow(self, user_id, author_id, active):
+        for connection in self.by_user.get(user_id, ()):
+            if active:
+                connection.authors.add(author_id)
+                self.by_author.setdefault(author_id, set()).add(connection)
+            elif author_id in connection.authors:
+                connection.authors.discard(author_id)
+                self.discard(self.by_author, author_id, connection)
+
+
+class PostgresBroker(LocalBroker):
+    """Сообщения через NOTIFY/LISTEN PostgreSQL между всеми воркерами."""
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+        self.listening = False
+
+    def connect(self, connection):
+        super().connect(connection)
+        if not self.listening:
+            self.listening = True
+            self.loop.create_task(self.listen())
+
+    def publish(self, message):
+        # NOTIFY доставляется после коммита транзакции.
+        with connections[PRIMARY_DB].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [settings.EVENTS_CHANNEL, json.dumps(message)])
+
+    async def listen(self):
+        try:
+            self.listener = await self.loop.run_in_executor(
+                None, self.open_listener)
+        except psycopg2.Error:
+            self.retry()
+            return
+        self.loop.add_reader(self.listener.fileno(), self.receive)
+
+    @staticmethod
+    def open_listener():
+        listener = psycopg2.connect(
+            **connections[PRIMARY_DB].get_connection_params())
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {settings.EVENTS_CHANNEL}')
+        return listener
+
+    def receive(self):
+        try:
+            self.listener.poll()
+        except psycopg2.Error:
+            self.loop.remove_reader(self.listener.fileno())
+            self.listener.close()
+            self.listener = None
+            self.retry()
+            return
+        while self.listener.notifies:
+            self.dispatch(json.loads(self.listener.notifies.pop(0).payload))
+
+    def retry(self):
+        # Сообщения за время переподключения клиенты получат
+        # через /api/recipes/changes/.
+        self.listening = False
+        if self.by_user:
+            self.listening = True
+            self.loop.call_later(
+                settings.EVENTS_RECONNECT_DELAY,
+                lambda: self.loop.create_task(self.listen()))
+
+
+BROKERS = {
+    'none': NullBroker,
+    'local': LocalBroker,
+    'postgres': PostgresBroker,
+}
+
+broker = BROKERS[settings.EVENTS_BACKEND]()
+
+
+def recipe_message(recipe):
+    return {
+        'event': 'recipe',
+        'author': recipe.author_id,
+        'recipe': {
+            'id': recipe.id,
+            'name': recipe.name,
+            'image': recipe.image.url if recipe.image else None,
+            'cooking_time': recipe.cooking_time,
+            'author': recipe.author_id,
+        },
+    }
+
+
+def follow_message(user_id, author_id, active):
+    return {
+        'event': 'follow',
+        'user': user_id,
+        'author': author_id,
+        'active': active,
+    }
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.db_router import reset_routing, route_reads_to_replica
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PIN_COOKIE = 'db_pin'
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/javascript', 'text/')
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """Безопасные запросы читают с реплик.
+
+    После записи пользователь на REPLICA_PIN_SECONDS закрепляется
+    за основной БД, чтобы видеть свои изменения (избранное, корзина).
+    Синхронный и асинхронный режимы определяет MiddlewareMixin.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        pin_key = self.get_pin_key(request)
+        token = route_reads_to_replica(
+            request.method in SAFE_METHODS
+            and not self.is_pinned(request, pin_key))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_routing(token)
+        if request.method not in SAFE_METHODS:
+            self.pin(response, pin_key)
+        return response
+
+    async def __acall__(self, request):
+        pin_key = self.get_pin_key(request)
+        safe = request.method in SAFE_METHODS
+        # Обращение к кэшу синхронное: выносим из event loop.
+        pinned = safe and await sync_to_async(
+            self.is_pinned, thread_sensitive=False)(request, pin_key)
+        token = route_reads_to_replica(safe and not pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_routing(token)
+        if not safe:
+            await sync_to_async(
+                self.pin, thread_sensitive=False)(response, pin_key)
+        return response
+
+    @staticmethod
+    def get_pin_key(request):
+        credentials = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        if not credentials:
+            return None
+        return 'db-pin:' + hashlib.sha1(credentials.encode()).hexdigest()
+
+    @staticmethod
+    def is_pinned(request, pin_key):
+        if PIN_COOKIE in request.COOKIES:
+            return True
+        return pin_key is not None and cache.get(pin_key) is not None
+
+    @staticmethod
+    def pin(response, pin_key):
+        if pin_key is not None:
+            cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        response.set_cookie(
+            PIN_COOKIE, '1',
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True, samesite='Lax')
+
+
+def gzip_compress(content):
+    # Без времени в заголовке: одинаковое содержимое - одинаковый результат.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+COMPRESSORS = {'gzip': gzip_compress}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda content: brotli.compress(content, quality=5)
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0."""
+    encodings = set()
+    for item in header.split(','):
+        encoding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжатие ответов: brotli (если установлен) или gzip по Accept-Encoding.
+
+    Ответы меньше COMPRESSION_MIN_SIZE отдаются как есть. Сжатые крупные
+    GET-ответы кэшируются по хэшу содержимого: одинаковые списки
+    (ингредиенты, теги) не сжимаются заново в каждом запросе.
+    """
+
+    def process_response(self, request, response):
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES)
+                or len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        if self.is_cacheable(request, response):
+            content = self.compress_cached(encoding, response.content)
+        else:
+            content = COMPRESSORS[encoding](response.content)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    @staticmethod
+    def choose_encoding(header):
+        encodings = accepted_encodings(header)
+        for encoding in ('br', 'gzip'):
+            if encoding in COMPRESSORS and encoding in encodings:
+                return encoding
+        return None
+
+    @staticmethod
+    def is_cacheable(request, response):
+        return (
+            request.method in ('GET', 'HEAD')
+            and len(response.content) >= settings.COMPRESSION_CACHE_MIN_SIZE
+            and 'no-store' not in response.get('Cache-Control', ''))
+
+    @staticmethod
+    def compress_cached(encoding, content):
+        key = 'compressed:{}:{}'.format(
+            encoding, hashlib.blake2b(content, digest_size=16).hexdigest())
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = COMPRESSORS[encoding](content)
+            cache.set(key, compressed, settings.COMPRESSION_CACHE_TTL)
+        return compressed
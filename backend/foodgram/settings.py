@@ -1,4 +1,8 @@
 import os
+import sys
+from importlib.util import find_spec
+from tempfile import gettempdir
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -34,6 +38,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.middleware.CompressionMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,8 +88,56 @@ DATABASES = {
         'PORT': os.getenv(
             'DB_PORT',
             default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
     }}
 
+# Реплики для чтения: DB_REPLICAS=host1,host2 (для SQLite - пути к файлам).
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(',')),
+        start=1):
+    alias = f'replica_{index}'
+    location = 'NAME' if 'sqlite' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+# Тесты маршрутизации (foodgram.tests) без DB_REPLICAS читают
+# с зеркала основной тестовой БД; запросы остальных тестов на него
+# не направляются.
+if not DATABASE_REPLICAS and sys.argv[1:2] == ['test']:
+    DATABASES['replica_1'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Сколько секунд после записи читать из основной БД.
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=5))
+
+# Кэш должен быть общим для всех воркеров: в нем закрепление за основной
+# БД после записи, пользователи по токенам, /api/users/me/ и версии
+# счётчиков фильтров. По умолчанию - файлы, общие для воркеров на одной
+# машине; для нескольких машин - memcached:
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache,
+# CACHE_LOCATION=memcached:11211. LocMemCache у каждого воркера свой -
+# только для разработки с одним процессом.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(gettempdir(), 'foodgram-cache')),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -115,14 +169,29 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Сгенерированные файлы (список покупок) отдает nginx: Django пишет файл
+# в DOWNLOADS_ROOT и возвращает X-Accel-Redirect на internal location.
+USE_X_ACCEL_REDIRECT = os.getenv(
+    'USE_X_ACCEL_REDIRECT', default='False') == 'True'
+DOWNLOADS_ROOT = os.path.join(BASE_DIR, 'downloads')
+DOWNLOADS_INTERNAL_URL = '/protected/downloads/'
+DOWNLOADS_MAX_AGE = 24 * 3600
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Время жизни кэша пользователя по токену, секунды.
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=60))
+# Кэш ответа /api/users/me/, секунды. Сбрасывается при изменении
+# пользователя - во всех воркерах, только если кэш общий (CACHES).
+CURRENT_USER_CACHE_TTL = int(
+    os.getenv('CURRENT_USER_CACHE_TTL', default=60))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -130,4 +199,149 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_THROTTLE_RATES': {
+        'download': '10/min',
+        'recipe_write': '30/min',
+        'recipe_import': '10/hour',
+        'recipe_list': '120/min',
+        'subscribe': '60/min',
+        'login': '10/min',
+    },
+    # Адрес клиента для ограничения частоты - из X-Forwarded-For,
+    # добавленного NUM_PROXIES прокси (nginx); адреса, присланные
+    # клиентом в этом заголовке, не учитываются.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
 }
+
+# Корзины токенов для ограничения частоты запросов (api.throttling):
+# файл в разделяемой памяти, общий для воркеров на одной машине.
+THROTTLE_STORE_PATH = os.getenv(
+    'THROTTLE_STORE_PATH',
+    default=os.path.join(gettempdir(), 'foodgram-throttle'))
+THROTTLE_SLOTS = 65536
+
+# JSON через orjson, если он установлен.
+if find_spec('orjson'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ]
+
+# Сжатие ответов (gzip, brotli - если установлен) от COMPRESSION_MIN_SIZE
+# байт. Сжатые GET-ответы кэшируются по хэшу содержимого.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CACHE_MIN_SIZE = 16 * 1024
+COMPRESSION_CACHE_TTL = 600
+
+# Рейтинг популярных рецептов (команда update_trending).
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', default=7))
+TRENDING_SIZE = int(os.getenv('TRENDING_SIZE', default=1000))
+
+# Лента подписок: рецепты авторов с большим числом подписчиков
+# не раскладываются по лентам, а читаются при запросе.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000))
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 100
+FEED_CELEBRITIES_CACHE_TTL = 600
+
+# Похожие рецепты (команда build_similar_recipes).
+SIMILAR_RECIPES_TOP_K = 10
+SIMILAR_RECIPES_CHUNK_SIZE = 1000
+SIMILAR_RECIPES_MAX_CANDIDATES = 5000
+
+# Очередь пересчетов по сохраненным рецептам (recipes.pending,
+# команда process_pending_updates): рецептов в одной транзакции.
+PENDING_UPDATES_BATCH_SIZE = 100
+
+# Индекс ингредиентов в памяти воркера для поиска "что приготовить":
+# полная перестройка раз в PANTRY_INDEX_MAX_AGE секунд, журнал изменений
+# хранится PANTRY_INDEX_LOG_TTL секунд.
+PANTRY_INDEX_MAX_AGE = 3600
+PANTRY_INDEX_LOG_TTL = 24 * 3600
+PANTRY_MAX_MISSING = 10
+
+# Режим сервера: wsgi (по умолчанию) или asgi (uvicorn-воркеры gunicorn).
+# В ASGI-режиме горячие эндпоинты чтения обслуживаются асинхронно,
+# запросы к БД выполняются в пуле из ASYNC_DB_THREADS потоков.
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+ASYNC_READ_VIEWS = SERVER_MODE == 'asgi'
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', default=8))
+
+# Заполнять кэши данных из БД при прогреве gunicorn (foodgram.warmup).
+WARMUP_DATA = os.getenv('WARMUP_DATA', default='True') == 'True'
+
+# Выгрузка каталога для аналитики (api.export): строк в пачке курсора
+# и отставание водяного знака от текущего времени, секунды (больше
+# задержки реплики и длительности транзакций записи).
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_WATERMARK_DELAY = 60
+
+# Импорт рецептов (recipes.importer): рецептов в транзакции, потоков
+# загрузки изображений; локальные изображения - из IMPORT_IMAGES_ROOT.
+# Изображения по http(s)-адресу - только с хостов IMPORT_IMAGE_HOSTS
+# (через запятую; по умолчанию загрузка по адресу запрещена).
+IMPORT_IMAGES_ROOT = os.getenv(
+    'IMPORT_IMAGES_ROOT', default=os.path.join(BASE_DIR, 'import'))
+IMPORT_IMAGE_HOSTS = list(
+    filter(None, os.getenv('IMPORT_IMAGE_HOSTS', default='').split(',')))
+IMPORT_BATCH_SIZE = 500
+IMPORT_IMAGE_WORKERS = 8
+IMPORT_IMAGE_TIMEOUT = 10
+IMPORT_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+# Наибольший размер NDJSON в POST /api/recipes/import/; импорт идет
+# внутри запроса, большие файлы загружаются командой import_recipes.
+IMPORT_MAX_BODY_SIZE = 5 * 1024 * 1024
+
+# Синхронизация изменений (api/recipes/changes/): рецептов в ответе,
+# перекрытие окон синхронизации и срок хранения записей об удалении
+# (команда clean_tombstones).
+SYNC_CHANGES_LIMIT = 500
+SYNC_OVERLAP_SECONDS = 5
+SYNC_TOMBSTONE_TTL = int(
+    os.getenv('SYNC_TOMBSTONE_TTL', default=30 * 24 * 3600))
+
+# Поток событий (SSE) о новых рецептах авторов из подписок, только
+# в ASGI-режиме. Брокер: postgres (NOTIFY/LISTEN, между воркерами),
+# local (внутри процесса) или none (по умолчанию в WSGI-режиме:
+# слушать некому, сообщения не публикуются). Очередь медленного
+# клиента ограничена EVENTS_QUEUE_SIZE сообщениями, после чего поток
+# закрывается.
+EVENTS_PATH = '/api/events/'
+if SERVER_MODE != 'asgi':
+    EVENTS_DEFAULT_BACKEND = 'none'
+elif 'postgresql' in DATABASES['default']['ENGINE']:
+    EVENTS_DEFAULT_BACKEND = 'postgres'
+else:
+    EVENTS_DEFAULT_BACKEND = 'local'
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND') or EVENTS_DEFAULT_BACKEND
+EVENTS_CHANNEL = 'foodgram_events'
+EVENTS_HEARTBEAT = 15
+EVENTS_RETRY_MS = 5000
+EVENTS_QUEUE_SIZE = 100
+EVENTS_RECONNECT_DELAY = 5
+
+# Счётчики фильтров списка рецептов (api/recipes/facets/): верхние
+# границы интервалов времени приготовления (до 600 минут) и время
+# жизни кэша; при изменении рецептов кэш сбрасывается сменой версии
+# в кэше - для всех воркеров, только если кэш общий (CACHES).
+FACETS_COOKING_TIME_BOUNDS = (15, 30, 60, 120, 600)
+FACETS_CACHE_TTL = int(os.getenv('FACETS_CACHE_TTL', default=120))
+
+# Поиск дубликатов рецептов (recipes.dedup): MinHash-подпись из
+# DEDUP_NUM_PERM хэшей по шинглам из DEDUP_SHINGLE_SIZE слов описания
+# и ингредиентам, DEDUP_BANDS полос LSH. Дубликат - оценка сходства
+# Жаккара не ниже DEDUP_THRESHOLD; полный пересчет блоками по
+# DEDUP_CHUNK_SIZE рецептов (команда find_duplicate_recipes).
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16
+DEDUP_SHINGLE_SIZE = 3
+DEDUP_THRESHOLD = 0.8
+DEDUP_MAX_CANDIDATES = 1000
+DEDUP_CHUNK_SIZE = 500
+DEDUP_SEED = 1
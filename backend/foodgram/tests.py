@@ -0,0 +1,140 @@
+"""Маршрутизация запросов между основной БД и репликами.
+
+Без DB_REPLICAS реплика в тестах - зеркало основной тестовой БД
+(foodgram.settings).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from foodgram.db_router import (PRIMARY_DB, ReplicaRouter, reset_routing,
+                                route_reads_to_replica)
+from foodgram.middleware import PIN_COOKIE, ReplicaRoutingMiddleware
+from recipes.models import Recipe
+
+REPLICA = 'replica_1'
+# Кэш в памяти, чтобы тесты не очищали кэш запущенных воркеров.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def read_with_replicas(self, enabled):
+        token = route_reads_to_replica(enabled)
+        try:
+            return self.router.db_for_read(Recipe)
+        finally:
+            reset_routing(token)
+
+    def test_reads_go_to_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(Recipe), PRIMARY_DB)
+
+    def test_reads_go_to_replica_when_enabled(self):
+        self.assertEqual(self.read_with_replicas(True), REPLICA)
+        self.assertEqual(self.read_with_replicas(False), PRIMARY_DB)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(self.read_with_replicas(True), PRIMARY_DB)
+
+    def test_writes_go_to_primary(self):
+        token = route_reads_to_replica(True)
+        try:
+            self.assertEqual(self.router.db_for_write(Recipe), PRIMARY_DB)
+            # Выбор БД для записи не меняет маршрутизацию чтения.
+            self.assertEqual(self.router.db_for_read(Recipe), REPLICA)
+        finally:
+            reset_routing(token)
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate(PRIMARY_DB, 'recipes'))
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'recipes'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], CACHES=TEST_CACHES)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.read_from = []
+
+    def get_response(self, request):
+        self.read_from.append(self.router.db_for_read(Recipe))
+        return HttpResponse()
+
+    def call(self, request):
+        return ReplicaRoutingMiddleware(self.get_response)(request)
+
+    def test_safe_request_reads_from_replica(self):
+        response = self.call(self.factory.get('/api/recipes/'))
+        self.assertEqual(self.read_from, [REPLICA])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_reads_from_primary_and_pins(self):
+        response = self.call(self.factory.post('/api/recipes/'))
+        self.assertEqual(self.read_from, [PRIMARY_DB])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            response.cookies[PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS)
+
+    def test_pin_cookie_reads_from_primary(self):
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.call(request)
+        self.assertEqual(self.read_from, [PRIMARY_DB])
+
+    def test_token_pinned_without_cookie(self):
+        # Клиент без cookie (мобильное приложение) закрепляется по токену
+        # через кэш - следующий запрос может прийти в другой воркер.
+        auth = {'HTTP_AUTHORIZATION': 'Token 123'}
+        self.call(self.factory.post('/api/recipes/', **auth))
+        self.call(self.factory.get('/api/recipes/', **auth))
+        self.call(self.factory.get(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token 456'))
+        self.assertEqual(self.read_from, [PRIMARY_DB, PRIMARY_DB, REPLICA])
+
+    def test_pin_expires(self):
+        auth = {'HTTP_AUTHORIZATION': 'Token 123'}
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.call(self.factory.post('/api/recipes/', **auth))
+        self.call(self.factory.get('/api/recipes/', **auth))
+        self.assertEqual(self.read_from, [PRIMARY_DB, REPLICA])
+
+    def test_routing_reset_after_request(self):
+        self.call(self.factory.get('/api/recipes/'))
+        self.assertEqual(self.router.db_for_read(Recipe), PRIMARY_DB)
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], CACHES=TEST_CACHES)
+class ReplicaDatabaseTests(TestCase):
+    databases = {PRIMARY_DB, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_reads_from_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            with CaptureQueriesContext(connections[PRIMARY_DB]) as primary:
+                response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(primary.captured_queries)
+
+    def test_reads_from_primary_after_write(self):
+        self.client.post('/api/users/', {})
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(replica.captured_queries)
@@ -0,0 +1,74 @@
+"""Прогрев приложения в мастер-процессе gunicorn (preload_app).
+
+Всё, что загружено до форка, воркеры получают готовым: импорты,
+шрифт для PDF, разобранные URL, метаданные моделей для сериализаторов,
+индекс ингредиентов. Соединения с БД и кэшем закрываются перед форком,
+чтобы воркеры не делили сокеты.
+"""
+import inspect
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.urls import URLResolver, get_resolver
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+
+def import_heavy_modules():
+    """Загрузить reportlab и шрифт, которые иначе грузятся при запросе."""
+    from api import pdf
+
+    pdf.register_font()
+
+
+def populate_url_resolvers(resolver=None):
+    """Импортировать urlconf, скомпилировать шаблоны URL и словари reverse."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            populate_url_resolvers(pattern)
+    resolver.reverse_dict
+
+
+def build_serializer_fields():
+    """Построить поля всех сериализаторов API.
+
+    Заполняет кэши метаданных моделей (_meta), которые DRF
+    обходит при первом создании каждого ModelSerializer.
+    """
+    from api import serializers as api_serializers
+
+    for _, serializer_class in inspect.getmembers(
+            api_serializers, inspect.isclass):
+        if (issubclass(serializer_class, serializers.BaseSerializer)
+                and serializer_class.__module__ == api_serializers.__name__):
+            serializer_class().fields
+
+
+def prime_data_caches():
+    """Заполнить кэши справочных данных из БД."""
+    from recipes import pantry, timeline
+
+    timeline.celebrity_authors()
+    pantry.index.sync()
+
+
+def warm_up():
+    started = time.perf_counter()
+    import_heavy_modules()
+    populate_url_resolvers()
+    build_serializer_fields()
+    if settings.WARMUP_DATA:
+        try:
+            prime_data_caches()
+        except DatabaseError:
+            logger.warning('Кэши данных не прогреты: БД недоступна.')
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+    logger.info('Прогрев занял %.2f с.', time.perf_counter() - started)
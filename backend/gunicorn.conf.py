@@ -0,0 +1,24 @@
+"""Настройки gunicorn.
+
+Приложение загружается и прогревается в мастер-процессе (preload_app),
+воркеры получают его готовым через fork.
+"""
+import os
+
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', default=1))
+preload_app = os.getenv('GUNICORN_PRELOAD', default='True') == 'True'
+
+if os.getenv('SERVER_MODE') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from foodgram.warmup import warm_up
+
+    warm_up()
@@ -1,7 +1,14 @@
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.template.response import TemplateResponse
 
-from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Subscribe, Tag)
+from foodgram.paginators import EstimatedCountPaginator
+from .models import (DuplicateCandidate, FavoriteRecipe, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Subscribe, Tag)
+from .signals import recipe_saved
 
 EMPTY_MSG = '-пусто-'
 
@@ -17,15 +24,60 @@ class RecipeAdmin(admin.ModelAdmin):
         'id', 'get_author', 'name', 'text',
         'cooking_time', 'get_tags', 'get_ingredients',
         'pub_date', 'get_favorite_count')
+    list_select_related = ('author',)
     search_fields = (
-        'name', 'cooking_time',
-        'author__email', 'ingredients__name')
+        '^name', '=author__email', '=cooking_time', '^ingredients__name')
     list_filter = ('pub_date', 'tags',)
     inlines = (RecipeIngredientAdmin,)
     empty_value_display = EMPTY_MSG
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorite_count=Coalesce(Subquery(
+                FavoriteRecipe.objects.filter(
+                    recipe=OuterRef('pk')
+                ).order_by().values('recipe').annotate(
+                    count=Count('id')).values('count')), 0)
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')))
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по search_fields: каждое условие - отдельный подзапрос
+        по своему индексу (recipe_name_upper_idx, ingredient_name_upper_idx),
+        объединенный через UNION, без JOIN и DISTINCT в основном запросе."""
+
+        for term in search_term.split():
+            matches = Recipe.objects.order_by().filter(
+                name__istartswith=term
+            ).values('id').union(
+                Recipe.objects.order_by().filter(
+                    author__email__iexact=term).values('id'),
+                RecipeIngredient.objects.order_by().filter(
+                    ingredient__name__istartswith=term
+                ).values('recipe_id'))
+            if term.isdigit():
+                matches = matches.union(Recipe.objects.order_by().filter(
+                    cooking_time=int(term)).values('id'))
+            queryset = queryset.filter(id__in=matches)
+        return queryset, False
+
+    def save_related(self, request, form, formsets, change):
+        previous_ingredients = dict(form.instance.recipe.values_list(
+            'ingredient_id', 'amount')) if change else None
+        super().save_related(request, form, formsets, change)
+        recipe_saved.send(
+            sender=Recipe, recipe=form.instance, created=not change,
+            previous_ingredients=previous_ingredients)
 
     @admin.display(
-        description='Электронная почта автора')
+        description='Электронная почта автора',
+        ordering='author__email')
     def get_author(self, obj):
         return obj.author.email
 
@@ -37,15 +89,15 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description=' Ингредиенты ')
     def get_ingredients(self, obj):
         return '\n '.join([
-            f'{item["ingredient__name"]} - {item["amount"]}'
-            f' {item["ingredient__measurement_unit"]}.'
-            for item in obj.recipe.values(
-                'ingredient__name',
-                'amount', 'ingredient__measurement_unit')])
+            f'{item.ingredient.name} - {item.amount}'
+            f' {item.ingredient.measurement_unit}.'
+            for item in obj.recipe.all()])
 
-    @admin.display(description='В избранном')
+    @admin.display(
+        description='В избранном',
+        ordering='favorite_count')
     def get_favorite_count(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorite_count
 
 
 @admin.register(Tag)
@@ -69,40 +121,100 @@ class IngredientAdmin(admin.ModelAdmin):
 class SubscribeAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'user', 'author', 'created',)
+    list_select_related = ('user', 'author')
     search_fields = (
-        'user__email', 'author__email',)
+        '=user__email', '=author__email',)
+    raw_id_fields = ('user', 'author')
     empty_value_display = EMPTY_MSG
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
-@admin.register(FavoriteRecipe)
-class FavoriteRecipeAdmin(admin.ModelAdmin):
+class RecipeListItemAdmin(admin.ModelAdmin):
+    """Строки избранного и списка покупок."""
+
     list_display = (
-        'id', 'user', 'get_recipe', 'get_count')
+        'id', 'user', 'recipe', 'created')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = (
+        '=user__email', '^recipe__name',)
+    raw_id_fields = ('user', 'recipe')
     empty_value_display = EMPTY_MSG
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    @admin.display(
-        description='Рецепты')
-    def get_recipe(self, obj):
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:5]]
+    def get_readonly_fields(self, request, obj=None):
+        # Изменение строки не отправляет recipes_list_changed:
+        # рецепт или пользователя меняют удалением и добавлением.
+        if obj is not None:
+            return ('user', 'recipe')
+        return ()
 
-    @admin.display(
-        description='В избранных')
-    def get_count(self, obj):
-        return obj.recipe.count()
+
+@admin.register(FavoriteRecipe)
+class FavoriteRecipeAdmin(RecipeListItemAdmin):
+    pass
 
 
 @admin.register(ShoppingCart)
-class SoppingCartAdmin(admin.ModelAdmin):
-    list_display = (
-        'id', 'user', 'get_recipe', 'get_count')
-    empty_value_display = EMPTY_MSG
+class SoppingCartAdmin(RecipeListItemAdmin):
+    pass
 
-    @admin.display(description='Рецепты')
-    def get_recipe(self, obj):
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:5]]
 
-    @admin.display(description='В избранных')
-    def get_count(self, obj):
-        return obj.recipe.count()
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'recipe', 'get_recipe_author', 'duplicate',
+        'get_duplicate_author', 'same_author', 'similarity', 'created')
+    list_select_related = ('recipe__author', 'duplicate__author')
+    list_filter = ('created',)
+    search_fields = (
+        '^recipe__name', '=recipe__author__email',)
+    raw_id_fields = ('recipe', 'duplicate')
+    actions = ('delete_copies',)
+    empty_value_display = EMPTY_MSG
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='Автор рецепта')
+    def get_recipe_author(self, obj):
+        return obj.recipe.author
+
+    @admin.display(description='Автор похожего рецепта')
+    def get_duplicate_author(self, obj):
+        return obj.duplicate.author
+
+    @admin.display(boolean=True, description='Тот же автор')
+    def same_author(self, obj):
+        return obj.recipe.author_id == obj.duplicate.author_id
+
+    @admin.action(description='Удалить копии (более новые рецепты)')
+    def delete_copies(self, request, queryset):
+        """Удалить более новый рецепт пар одного автора после подтверждения.
+
+        Пары разных авторов не удаляются: их проверяют вручную.
+        """
+
+        if not request.user.has_perm('recipes.delete_recipe'):
+            raise PermissionDenied
+        pairs, skipped = [], []
+        for pair in queryset.select_related(
+                'recipe__author', 'duplicate__author'):
+            (pairs if self.same_author(pair) else skipped).append(pair)
+        if request.POST.get('post') != 'yes':
+            return TemplateResponse(
+                request,
+                'admin/recipes/duplicatecandidate/delete_copies.html',
+                {**self.admin_site.each_context(request),
+                 'title': 'Удаление копий рецептов',
+                 'opts': self.model._meta,
+                 'pairs': pairs,
+                 'skipped': skipped,
+                 'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+                 'media': self.media})
+        recipe_ids = {pair.recipe_id for pair in pairs}
+        Recipe.objects.filter(id__in=recipe_ids).delete()
+        message = f'Удалено рецептов: {len(recipe_ids)}'
+        if skipped:
+            message += f', пропущено пар разных авторов: {len(skipped)}'
+        self.message_user(request, message)
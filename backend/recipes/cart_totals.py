@@ -0,0 +1,104 @@
+"""Итоги списка покупок по ингредиентам, обновляемые приращениями."""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingCartTotal
+
+BATCH_SIZE = 1000
+
+
+def recipe_amounts(recipe_ids):
+    """Суммарное количество каждого ингредиента в рецептах."""
+
+    return Counter(dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values('ingredient_id').annotate(
+        total=Sum('amount')).values_list('ingredient_id', 'total')))
+
+
+def apply_deltas(user_ids, deltas):
+    """Прибавить {ingredient_id: delta} к итогам каждого пользователя."""
+
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            users = user_ids[start:start + BATCH_SIZE]
+            ShoppingCartTotal.objects.bulk_create(
+                [ShoppingCartTotal(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=0)
+                 for user_id in users for ingredient_id in deltas],
+                ignore_conflicts=True)
+            totals = ShoppingCartTotal.objects.filter(
+                user_id__in=users, ingredient_id__in=deltas)
+            totals.update(amount=F('amount') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(delta))
+                  for ingredient_id, delta in deltas.items()],
+                default=Value(0)))
+            totals.filter(amount__lte=0).delete()
+
+
+def cart_changed(user_id, recipe_ids, sign):
+    amounts = recipe_amounts(recipe_ids)
+    apply_deltas([user_id], {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in amounts.items()})
+
+
+def recipe_changed(recipe_id, previous, current):
+    """Пересчитать итоги у всех, у кого рецепт в списке покупок."""
+
+    deltas = Counter(current)
+    deltas.subtract(previous)
+    apply_deltas(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True),
+        deltas)
+
+
+def user_totals(user):
+    return ShoppingCartTotal.objects.filter(
+        user=user
+    ).values(
+        'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name')
+
+
+def rebuild(user_ids=None):
+    """Пересчитать итоги с нуля, вернуть число исправленных строк."""
+
+    # Фильтр по пользователям - в том же filter(), что и соединение
+    # с корзиной: отдельный filter() добавил бы второе соединение
+    # и умножил бы суммы на число рецептов в корзине.
+    carts = {'recipe__shopping_cart_items__isnull': False}
+    stored = ShoppingCartTotal.objects.all()
+    if user_ids is not None:
+        carts = {'recipe__shopping_cart_items__user_id__in': user_ids}
+        stored = stored.filter(user_id__in=user_ids)
+    expected = RecipeIngredient.objects.filter(**carts).order_by().values(
+        'recipe__shopping_cart_items__user_id', 'ingredient_id'
+    ).annotate(total=Sum('amount'))
+    expected = {
+        (row['recipe__shopping_cart_items__user_id'],
+         row['ingredient_id']): row['total'] for row in expected}
+    with transaction.atomic():
+        current = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in stored.values_list(
+                'user_id', 'ingredient_id', 'amount')}
+        stored.delete()
+        ShoppingCartTotal.objects.bulk_create(
+            [ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+             for (user_id, ingredient_id), amount in expected.items()],
+            batch_size=BATCH_SIZE)
+    return sum(
+        current.get(key) != expected.get(key)
+        for key in current.keys() | expected.keys())
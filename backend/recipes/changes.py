@@ -0,0 +1,107 @@
+"""Синхронизация изменений для офлайн-клиентов (api/recipes/changes/).
+
+Токен - позиция (updated_at, id) последнего отданного рецепта, либо
+момент запроса, если отданы все изменения. Удаления рецептов и
+удаления из избранного/корзины берутся из RecipeTombstone.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import FavoriteRecipe, RecipeTombstone, ShoppingCart
+
+LIST_KINDS = {
+    FavoriteRecipe: RecipeTombstone.FAVORITE,
+    ShoppingCart: RecipeTombstone.SHOPPING_CART,
+}
+
+
+def encode_token(moment, recipe_id=0):
+    return base64.urlsafe_b64encode(
+        f'{moment.isoformat()}|{recipe_id}'.encode()).decode()
+
+
+def decode_token(token):
+    """Разобрать токен, для некорректного вернуть None."""
+
+    try:
+        moment, recipe_id = base64.urlsafe_b64decode(
+            token.encode()).decode().split('|')
+        moment, recipe_id = datetime.fromisoformat(moment), int(recipe_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    # Токены выдаются с часовым поясом; без него время не сравнить.
+    if moment.tzinfo is None:
+        return None
+    return moment, recipe_id
+
+
+def is_expired(position):
+    """Записи об удалении старше SYNC_TOMBSTONE_TTL уже удалены."""
+
+    return position[0] < timezone.now() - timedelta(
+        seconds=settings.SYNC_TOMBSTONE_TTL)
+
+
+def next_token(started):
+    # Транзакции, начатые до запроса, могут зафиксироваться позже
+    # с более ранним updated_at: следующий запрос их перечитает.
+    return encode_token(
+        started - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS))
+
+
+def changed_recipes(queryset, position, limit):
+    """Рецепты, изменённые после позиции токена, в порядке изменения."""
+
+    if position is not None:
+        moment, recipe_id = position
+        queryset = queryset.filter(
+            Q(updated_at__gt=moment) | Q(updated_at=moment, id__gt=recipe_id))
+    return list(queryset.order_by('updated_at', 'id')[:limit])
+
+
+def deleted_recipes(position):
+    if position is None:
+        return []
+    return list(RecipeTombstone.objects.filter(
+        kind=RecipeTombstone.RECIPE, deleted__gte=position[0]
+    ).order_by().values_list('recipe_id', flat=True).distinct())
+
+
+def list_changes(list_model, user, position):
+    """Рецепты, добавленные в список пользователя и удалённые из него."""
+
+    items = list_model.objects.filter(user=user)
+    if position is None:
+        return {
+            'added': list(items.values_list('recipe_id', flat=True)),
+            'removed': []}
+    added = set(items.filter(
+        created__gte=position[0]).values_list('recipe_id', flat=True))
+    removed = set(RecipeTombstone.objects.filter(
+        user=user, kind=LIST_KINDS[list_model], deleted__gte=position[0]
+    ).values_list('recipe_id', flat=True))
+    # Удалённый и снова добавленный рецепт остаётся в списке.
+    removed -= set(items.filter(
+        recipe_id__in=removed).values_list('recipe_id', flat=True))
+    return {'added': sorted(added), 'removed': sorted(removed)}
+
+
+def record_list_removal(list_model, user, recipe_ids):
+    RecipeTombstone.objects.bulk_create(
+        RecipeTombstone(
+            kind=LIST_KINDS[list_model], user=user, recipe_id=recipe_id)
+        for recipe_id in recipe_ids)
+
+
+def clean(max_age=None):
+    """Удалить записи об удалении старше max_age секунд."""
+
+    return RecipeTombstone.objects.filter(
+        deleted__lt=timezone.now() - timedelta(
+            seconds=max_age or settings.SYNC_TOMBSTONE_TTL)
+    ).delete()[0]
@@ -0,0 +1,206 @@
+"""Поиск почти одинаковых рецептов: MinHash и LSH.
+
+Признаки рецепта - шинглы из DEDUP_SHINGLE_SIZE слов описания и
+ингредиенты. MinHash-подпись из DEDUP_NUM_PERM хэшей оценивает
+сходство Жаккара двух рецептов, полосы подписи (DEDUP_BANDS) хранятся
+как хэши корзин с индексом: кандидаты в дубликаты находятся запросом
+по корзинам, без сравнения со всем каталогом.
+
+Новые, измененные и импортированные рецепты проверяются командой
+process_pending_updates (recipes.pending), полный пересчет - команда
+find_duplicate_recipes.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import (DuplicateCandidate, Recipe, RecipeBand,
+                            RecipeIngredient, RecipeSignature)
+
+# Хэши признаков - 32 бита, перестановки - (a * x + b) mod PRIME
+# с a, b < PRIME < 2 ** 32: a * x + b < 2 ** 64, переполнения uint64 нет.
+PRIME = np.uint64(4294967291)
+WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=None)
+def permutations():
+    """Коэффициенты (a, b) перестановок; зерно фиксировано, чтобы
+    подписи совпадали между процессами и запусками."""
+
+    generator = np.random.RandomState(settings.DEDUP_SEED)
+    return (
+        generator.randint(
+            1, PRIME, size=settings.DEDUP_NUM_PERM, dtype=np.uint64),
+        generator.randint(
+            0, PRIME, size=settings.DEDUP_NUM_PERM, dtype=np.uint64))
+
+
+def features(text, ingredient_ids):
+    words = WORD.findall(text.lower())
+    size = settings.DEDUP_SHINGLE_SIZE
+    tokens = {
+        ' '.join(words[start:start + size])
+        for start in range(max(len(words) - size + 1, 1))} if words else set()
+    tokens.update(f'ingredient:{item}' for item in ingredient_ids)
+    return tokens
+
+
+def signature(tokens):
+    """MinHash-подпись (uint32 x DEDUP_NUM_PERM); None для пустого рецепта."""
+
+    if not tokens:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(
+            hashlib.blake2b(token.encode(), digest_size=4).digest(), 'little')
+         for token in tokens),
+        dtype=np.uint64, count=len(tokens))
+    a, b = permutations()
+    permuted = (np.outer(hashes, a) + b) % PRIME
+    return permuted.min(axis=0).astype('<u4')
+
+
+def buckets(values):
+    """Хэши полос подписи; номер полосы входит в хэш."""
+
+    rows = len(values) // settings.DEDUP_BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(
+            bytes([band]) + values[band * rows:(band + 1) * rows].tobytes(),
+            digest_size=8).digest(), 'little', signed=True)
+        for band in range(settings.DEDUP_BANDS)]
+
+
+def load_signature(value):
+    return np.frombuffer(bytes(value), dtype='<u4')
+
+
+def similarity(first, second):
+    """Оценка сходства Жаккара по доле совпавших хэшей."""
+    return float(np.mean(first == second))
+
+
+def compute(recipes):
+    """{id: подпись} для [(id, описание)] с ингредиентами одним запросом."""
+
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=[recipe_id for recipe_id, _ in recipes]
+    ).order_by().values_list('recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].append(ingredient_id)
+    return {
+        recipe_id: signature(features(text, ingredients[recipe_id]))
+        for recipe_id, text in recipes}
+
+
+def store(signatures):
+    """Сохранить подписи и корзины, вернуть {id: корзины}."""
+
+    recipe_ids = list(signatures)
+    by_recipe = {
+        recipe_id: buckets(values)
+        for recipe_id, values in signatures.items() if values is not None}
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeBand.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeSignature.objects.bulk_create(
+        RecipeSignature(recipe_id=recipe_id, signature=values.tobytes())
+        for recipe_id, values in signatures.items() if values is not None)
+    RecipeBand.objects.bulk_create(
+        (RecipeBand(recipe_id=recipe_id, bucket=bucket)
+         for recipe_id, recipe_buckets in by_recipe.items()
+         for bucket in recipe_buckets),
+        batch_size=5000)
+    return by_recipe
+
+
+def find_duplicates(signatures, by_recipe):
+    """Пары (новый id, старый id, сходство) с общими корзинами
+    и сходством не ниже DEDUP_THRESHOLD."""
+
+    members = defaultdict(set)
+    for recipe_id, bucket in RecipeBand.objects.filter(
+            bucket__in={bucket for recipe_buckets in by_recipe.values()
+                        for bucket in recipe_buckets}
+    ).values_list('recipe_id', 'bucket'):
+        members[bucket].add(recipe_id)
+    candidates = {}
+    for recipe_id, recipe_buckets in by_recipe.items():
+        found = set().union(*(members[bucket] for bucket in recipe_buckets))
+        found.discard(recipe_id)
+        candidates[recipe_id] = sorted(found)[
+            :settings.DEDUP_MAX_CANDIDATES]
+    other = dict(RecipeSignature.objects.filter(recipe_id__in={
+        candidate for found in candidates.values() for candidate in found
+        if candidate not in signatures}).values_list('recipe_id', 'signature'))
+    pairs = {}
+    for recipe_id, found in candidates.items():
+        for candidate in found:
+            values = signatures.get(candidate)
+            if values is None:
+                if candidate not in other:
+                    # Корзины без подписи: рецепт удален или пересчитывается.
+                    continue
+                values = load_signature(other[candidate])
+            score = similarity(signatures[recipe_id], values)
+            if score >= settings.DEDUP_THRESHOLD:
+                pair = max(recipe_id, candidate), min(recipe_id, candidate)
+                pairs[pair] = score
+    return [(recipe, duplicate, score)
+            for (recipe, duplicate), score in pairs.items()]
+
+
+def save_duplicates(pairs):
+    DuplicateCandidate.objects.bulk_create(
+        (DuplicateCandidate(
+            recipe_id=recipe_id, duplicate_id=duplicate_id, similarity=score)
+         for recipe_id, duplicate_id, score in pairs),
+        ignore_conflicts=True)
+
+
+def update_recipes(recipe_ids):
+    """Пересчитать подписи рецептов из очереди и найти их дубликаты,
+    удаленные рецепты пропускаются."""
+
+    signatures = compute(list(Recipe.objects.filter(
+        id__in=recipe_ids).values_list('id', 'text')))
+    with transaction.atomic():
+        by_recipe = store(signatures)
+        DuplicateCandidate.objects.filter(
+            Q(recipe_id__in=signatures)
+            | Q(duplicate_id__in=signatures)).delete()
+        save_duplicates(find_duplicates(signatures, by_recipe))
+
+
+def build_index(chunk_size=None):
+    """Пересчитать подписи всего каталога блоками по chunk_size.
+
+    Каждый блок сравнивается с уже обработанными рецептами и с самим
+    собой, поэтому каждая пара находится один раз.
+    """
+
+    chunk_size = chunk_size or settings.DEDUP_CHUNK_SIZE
+    RecipeBand.objects.all().delete()
+    DuplicateCandidate.objects.all().delete()
+    recipes = Recipe.objects.order_by('id').values_list(
+        'id', 'text').iterator(chunk_size=chunk_size)
+    total = found = 0
+    while True:
+        chunk = [recipe for _, recipe in zip(range(chunk_size), recipes)]
+        if not chunk:
+            break
+        signatures = compute(chunk)
+        with transaction.atomic():
+            pairs = find_duplicates(signatures, store(signatures))
+            save_duplicates(pairs)
+        total += len(chunk)
+        found += len(pairs)
+    RecipeSignature.objects.exclude(
+        recipe_id__in=RecipeBand.objects.values('recipe_id')).delete()
+    return total, found
@@ -0,0 +1,83 @@
+"""Счётчики для фильтров списка рецептов: теги и время приготовления.
+
+Все счётчики считаются одним запросом (условная агрегация) и кэшируются
+по набору фильтров. Версия в ключе кэша меняется при изменении
+рецептов и тегов, а для фильтров по избранному и корзине - ещё и при
+изменении списков пользователя. Версия хранится в общем кэше (CACHES),
+импорт меняет её один раз на пачку рецептов.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from recipes.models import Recipe, Tag
+
+VERSION_KEY = 'recipe-facets-version'
+# Фильтры, результат которых зависит от пользователя.
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def version_key(user_id=None):
+    if user_id is None:
+        return VERSION_KEY
+    return f'{VERSION_KEY}:{user_id}'
+
+
+def bump_version(user_id=None):
+    """Сбросить закэшированные счётчики (всех или одного пользователя)."""
+    # Версия - время, а не счётчик: после вытеснения ключа из кэша
+    # старые записи не совпадут с новой версией.
+    cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+    return [versions.get(key) or missing[key] for key in keys]
+
+
+def cache_key(filters, user_id):
+    """Ключ кэша для фильтров {имя: [значения]}."""
+    keys = [version_key()]
+    if user_id is not None and any(name in filters for name in USER_FILTERS):
+        keys.append(version_key(user_id))
+    signature = repr((
+        get_versions(keys), user_id if len(keys) > 1 else None,
+        sorted((name, sorted(values)) for name, values in filters.items())))
+    return 'recipe-facets:' + hashlib.md5(signature.encode()).hexdigest()
+
+
+def cooking_time_buckets():
+    """[(от, до)] минут по границам FACETS_COOKING_TIME_BOUNDS."""
+    bounds = (0, *settings.FACETS_COOKING_TIME_BOUNDS)
+    return [(low + 1, high) for low, high in zip(bounds, bounds[1:])]
+
+
+def count_facets(queryset):
+    """Число рецептов queryset всего, по тегам и по времени приготовления."""
+    tags = list(Tag.objects.values('id', 'name', 'color', 'slug'))
+    buckets = cooking_time_buckets()
+    aggregates = {'count': Count('id', distinct=True)}
+    for tag in tags:
+        aggregates[f'tag_{tag["id"]}'] = Count(
+            'id', filter=Q(tags=tag['id']), distinct=True)
+    for index, bounds in enumerate(buckets):
+        aggregates[f'time_{index}'] = Count(
+            'id', filter=Q(cooking_time__range=bounds), distinct=True)
+    # Отдельный подзапрос: соединение с тегами из фильтра по тегу
+    # не должно ограничивать счётчики остальных тегов.
+    counts = Recipe.objects.filter(
+        pk__in=queryset.order_by().values('pk')).aggregate(**aggregates)
+    return {
+        'count': counts['count'],
+        'tags': [
+            {**tag, 'count': counts[f'tag_{tag["id"]}']} for tag in tags],
+        'cooking_time': [
+            {'min': low, 'max': high, 'count': counts[f'time_{index}']}
+            for index, (low, high) in enumerate(buckets)],
+    }
@@ -0,0 +1,344 @@
+"""Пакетный импорт рецептов из NDJSON.
+
+Строка - рецепт:
+    {"name": "...", "text": "...", "cooking_time": 30,
+     "author": "email автора (необязательно)",
+     "tags": ["slug или название"],
+     "ingredients": [{"id": 1, "amount": 2},
+                     {"name": "соль", "measurement_unit": "г", "amount": 5}],
+     "image": "путь в каталоге импорта или http(s)-адрес"}
+
+Изображения по адресу загружаются только с хостов из IMPORT_IMAGE_HOSTS.
+
+Теги и ингредиенты сопоставляются по словарям в памяти, рецепты и связи
+вставляются bulk_create, по транзакции на пачку; изображения загружаются
+пулом потоков. Ошибка в строке не прерывает импорт. Похожие рецепты
+и дубликаты для импортированных рецептов пересчитываются командами
+build_similar_recipes и find_duplicate_recipes.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+from urllib.parse import urlparse
+from urllib.request import HTTPRedirectHandler, build_opener
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import recipes_imported
+
+User = get_user_model()
+
+RECIPE_FIELDS = ('name', 'text', 'cooking_time')
+
+
+class RowError(Exception):
+    """Ошибка в строке импорта."""
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = []
+        self.errors = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / max(self.elapsed, 1e-6)
+
+
+def check_image_url(url):
+    """Адрес изображения, если его хост разрешен в IMPORT_IMAGE_HOSTS."""
+    parsed = urlparse(url)
+    if (parsed.scheme not in ('http', 'https')
+            or parsed.hostname not in settings.IMPORT_IMAGE_HOSTS):
+        raise RowError(
+            f'image: загрузка с адреса {parsed.hostname or url} запрещена.')
+    return url
+
+
+class AllowedHostRedirectHandler(HTTPRedirectHandler):
+    """Переадресация только на разрешенные хосты."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_image_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+image_opener = build_opener(AllowedHostRedirectHandler)
+
+
+def insert_recipes(recipes):
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+        return
+    # bulk_create в Django 3.2 не возвращает id на SQLite.
+    # raw: сигналы post_save не раскладывают рецепт по лентам,
+    # это делает импорт после транзакции.
+    for recipe in recipes:
+        recipe.save_base(raw=True)
+
+
+class RecipeImporter:
+    """Импорт рецептов; одного импортёра хватает на весь файл."""
+
+    def __init__(self, author=None, images_root=None, batch_size=None,
+                 workers=None):
+        self.author = author
+        self.images_root = os.path.realpath(
+            images_root or settings.IMPORT_IMAGES_ROOT)
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.workers = workers or settings.IMPORT_IMAGE_WORKERS
+        self.tags = {}
+        for tag_id, slug, name in Tag.objects.values_list(
+                'id', 'slug', 'name'):
+            self.tags[slug.lower()] = tag_id
+            self.tags[name.lower()] = tag_id
+        self.ingredient_ids = set()
+        self.ingredients = {}
+        # Название -> id; None, если название есть в разных единицах.
+        self.ingredient_names = {}
+        for ingredient_id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator():
+            name = name.lower()
+            self.ingredient_ids.add(ingredient_id)
+            self.ingredients[name, unit.lower()] = ingredient_id
+            self.ingredient_names[name] = (
+                None if name in self.ingredient_names else ingredient_id)
+        self.authors = {}
+        self.report = ImportReport()
+
+    def run(self, lines, progress=None):
+        """Импортировать строки NDJSON; progress вызывается после пачки."""
+        rows = ((number, line) for number, line in enumerate(lines, 1)
+                if line.strip())
+        with ThreadPoolExecutor(
+                self.workers, thread_name_prefix='import') as pool:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch, pool)
+                if progress is not None:
+                    progress(self.report)
+        self.report.errors.sort()
+        return self.report
+
+    def import_batch(self, batch, pool):
+        self.report.rows += len(batch)
+        parsed = self.checked(batch, self.parse)
+        self.load_authors(row['author'] for _, row in parsed)
+        ready = self.checked(parsed, self.set_author)
+        for _, row in ready:
+            if row['image']:
+                row['image'] = pool.submit(self.store_image, row['image'])
+        valid = self.checked(ready, self.set_image)
+        if valid:
+            self.insert(valid)
+
+    def checked(self, rows, check):
+        """Пары (номер, check(строка)) для строк без ошибок."""
+        valid = []
+        for number, row in rows:
+            try:
+                valid.append((number, check(row)))
+            except RowError as error:
+                self.report.errors.append((number, str(error)))
+        return valid
+
+    def set_author(self, row):
+        row['recipe'].author_id = self.get_author(row['author'])
+        return row
+
+    @staticmethod
+    def set_image(row):
+        if row['image']:
+            row['recipe'].image = row['image'].result()
+        return row
+
+    def parse(self, line):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            raise RowError('Строка не является JSON.')
+        if not isinstance(data, dict):
+            raise RowError('Ожидается объект рецепта.')
+        recipe = Recipe(**{field: data.get(field) for field in RECIPE_FIELDS})
+        try:
+            recipe.clean_fields(exclude=[
+                field.name for field in Recipe._meta.fields
+                if field.name not in RECIPE_FIELDS])
+        except ValidationError as error:
+            raise RowError(format_error(error))
+        image = data.get('image')
+        if image is not None and not isinstance(image, str):
+            raise RowError('image: ожидается путь или адрес.')
+        author = data.get('author')
+        if author is not None and not isinstance(author, str):
+            raise RowError('author: ожидается email.')
+        return {
+            'recipe': recipe,
+            'author': author,
+            'tags': self.parse_tags(data.get('tags')),
+            'ingredients': self.parse_ingredients(data.get('ingredients')),
+            'image': image,
+        }
+
+    def parse_tags(self, tags):
+        if not isinstance(tags, list) or not tags:
+            raise RowError('tags: нужен хотя бы один тег.')
+        tag_ids = []
+        for tag in tags:
+            tag_id = self.tags.get(str(tag).lower())
+            if tag_id is None:
+                raise RowError(f'tags: тега {tag} не существует.')
+            if tag_id not in tag_ids:
+                tag_ids.append(tag_id)
+        return tag_ids
+
+    def parse_ingredients(self, ingredients):
+        if not isinstance(ingredients, list) or not ingredients:
+            raise RowError('ingredients: нужен хотя бы один ингредиент.')
+        amount_field = RecipeIngredient._meta.get_field('amount')
+        amounts = {}
+        for item in ingredients:
+            if not isinstance(item, dict):
+                raise RowError('ingredients: ожидается объект ингредиента.')
+            ingredient_id = self.find_ingredient(item)
+            if ingredient_id in amounts:
+                raise RowError('ingredients: ингредиенты повторяются.')
+            try:
+                amounts[ingredient_id] = amount_field.clean(
+                    item.get('amount'), None)
+            except ValidationError as error:
+                raise RowError(f'amount: {format_error(error)}')
+        return amounts
+
+    def find_ingredient(self, item):
+        if 'id' in item:
+            try:
+                ingredient_id = int(item['id'])
+            except (TypeError, ValueError):
+                ingredient_id = None
+            if ingredient_id not in self.ingredient_ids:
+                raise RowError(
+                    f'ingredients: ингредиента {item["id"]} не существует.')
+            return ingredient_id
+        name = str(item.get('name', '')).lower()
+        if 'measurement_unit' in item:
+            ingredient_id = self.ingredients.get(
+                (name, str(item['measurement_unit']).lower()))
+        else:
+            ingredient_id = self.ingredient_names.get(name)
+        if ingredient_id is None:
+            raise RowError(
+                f'ingredients: ингредиент {item.get("name")} не найден '
+                'или неоднозначен.')
+        return ingredient_id
+
+    def load_authors(self, emails):
+        emails = {email for email in emails
+                  if email and email not in self.authors}
+        if emails:
+            self.authors.update(User.objects.filter(
+                email__in=emails).values_list('email', 'id'))
+
+    def get_author(self, email):
+        if not email:
+            if self.author is None:
+                raise RowError('author: не указан автор.')
+            return self.author.id
+        if email not in self.authors:
+            raise RowError(f'author: пользователя {email} не существует.')
+        return self.authors[email]
+
+    def store_image(self, source):
+        """Прочитать изображение по пути или адресу и сохранить в storage.
+
+        Любая ошибка - ошибка строки, импорт остальных строк продолжается.
+        """
+        try:
+            data = self.read_image(source)
+            if len(data) > settings.IMPORT_IMAGE_MAX_SIZE:
+                raise RowError('image: файл слишком большой.')
+            try:
+                image = Image.open(BytesIO(data))
+                image.verify()
+            except (OSError, SyntaxError):
+                raise RowError('image: файл не является изображением.')
+            name = '{}.{}'.format(
+                hashlib.sha1(data).hexdigest()[:20], image.format.lower())
+            return default_storage.save(
+                Recipe._meta.get_field('image').generate_filename(None, name),
+                ContentFile(data))
+        except RowError:
+            raise
+        except Exception as error:
+            raise RowError(f'image: не удалось загрузить ({error}).')
+
+    def read_image(self, source):
+        limit = settings.IMPORT_IMAGE_MAX_SIZE
+        if urlparse(source).scheme:
+            with image_opener.open(
+                    check_image_url(source),
+                    timeout=settings.IMPORT_IMAGE_TIMEOUT) as response:
+                return response.read(limit + 1)
+        path = os.path.realpath(os.path.join(self.images_root, source))
+        if os.path.commonpath((path, self.images_root)) != self.images_root:
+            raise RowError('image: файл вне каталога импорта.')
+        with open(path, 'rb') as file:
+            return file.read(limit + 1)
+
+    def insert(self, rows):
+        now = timezone.now()
+        recipes = []
+        for _, row in rows:
+            row['recipe'].pub_date = row['recipe'].updated_at = now
+            recipes.append(row['recipe'])
+        try:
+            with transaction.atomic():
+                insert_recipes(recipes)
+                RecipeIngredient.objects.bulk_create([
+                    RecipeIngredient(
+                        recipe=row['recipe'], ingredient_id=ingredient_id,
+                        amount=amount)
+                    for _, row in rows
+                    for ingredient_id, amount in row['ingredients'].items()])
+                Recipe.tags.through.objects.bulk_create([
+                    Recipe.tags.through(recipe=row['recipe'], tag_id=tag_id)
+                    for _, row in rows for tag_id in row['tags']])
+        except DatabaseError as error:
+            for number, row in rows:
+                self.report.errors.append((number, f'БД: {error}'))
+                if row['recipe'].image:
+                    default_storage.delete(row['recipe'].image.name)
+            return
+        # bulk_create не отправляет post_save: ленты подписчиков, журнал
+        # индекса ингредиентов и счётчики фильтров обновляются на пачку.
+        recipes_imported.send(sender=Recipe, recipes=recipes)
+        self.report.created.extend(recipe.id for recipe in recipes)
+
+
+def format_error(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(
+            f'{field}: {" ".join(messages)}'
+            for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from recipes.similarity import build_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Пересчет похожих по ингредиентам рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int,
+            help='Сколько соседей хранить для рецепта')
+        parser.add_argument(
+            '--chunk-size', type=int,
+            help='Сколько рецептов обрабатывать за раз')
+
+    def handle(self, *args, **options):
+        count = build_neighbors(options['top_k'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны, рецептов: {count}'))
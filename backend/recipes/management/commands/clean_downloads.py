@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from foodgram import downloads
+
+
+class Command(BaseCommand):
+    help = 'Удаление старых файлов для скачивания (запускать по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=settings.DOWNLOADS_MAX_AGE,
+            help='Удалять файлы старше, секунд')
+
+    def handle(self, *args, **options):
+        removed = downloads.clean(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {removed}'))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes import changes
+
+
+class Command(BaseCommand):
+    help = ('Удаление старых записей об удалении рецептов '
+            '(запускать по расписанию)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=settings.SYNC_TOMBSTONE_TTL,
+            help='Удалять записи старше, секунд')
+
+    def handle(self, *args, **options):
+        removed = changes.clean(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {removed}'))
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipes.dedup import build_index
+
+
+class Command(BaseCommand):
+    help = 'Пересчет подписей рецептов и поиск дубликатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int,
+            help='Сколько рецептов обрабатывать за раз')
+
+    def handle(self, *args, **options):
+        total, found = build_index(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписи пересчитаны, рецептов: {total}, '
+            f'вероятных дубликатов: {found}'))
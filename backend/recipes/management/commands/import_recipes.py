@@ -0,0 +1,54 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from recipes.importer import RecipeImporter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пакетный импорт рецептов из NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON ("-" - stdin)')
+        parser.add_argument(
+            '--author',
+            help='email автора для строк без поля author')
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог с изображениями из поля image')
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько рецептов вставлять в одной транзакции')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Потоков загрузки изображений')
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(email=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователя {options["author"]} не существует.')
+        importer = RecipeImporter(
+            author, options['images_dir'], options['batch_size'],
+            options['workers'])
+        if options['path'] == '-':
+            report = importer.run(sys.stdin, self.progress)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                report = importer.run(file, self.progress)
+        for number, error in report.errors:
+            self.stderr.write(f'Строка {number}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано рецептов: {len(report.created)} '
+            f'из {report.rows}, ошибок: {len(report.errors)}, '
+            f'{report.elapsed:.1f} с ({report.rate:.0f} строк/с)'))
+
+    def progress(self, report):
+        self.stdout.write(
+            f'{report.rows} строк, {report.rate:.0f} строк/с')
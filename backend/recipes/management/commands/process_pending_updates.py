@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from recipes import dedup, pending, similarity
+from recipes.models import PendingRecipeUpdate
+
+
+class Command(BaseCommand):
+    help = ('Отложенные пересчеты по сохраненным рецептам '
+            '(запускать по расписанию)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько рецептов обрабатывать в одной транзакции')
+
+    def handle(self, *args, **options):
+        similar = pending.process(
+            PendingRecipeUpdate.SIMILAR, similarity.update_neighbors,
+            options['batch_size'])
+        duplicates = pending.process(
+            PendingRecipeUpdate.DEDUP, dedup.update_recipes,
+            options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны похожие рецепты: {similar}, '
+            f'поиск дубликатов: {duplicates}'))
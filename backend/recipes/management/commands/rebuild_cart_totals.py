@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipes.cart_totals import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересчет итогов списков покупок с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        fixed = rebuild(options['users'])
+        style = self.style.WARNING if fixed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Итоги пересчитаны, исправлено строк: {fixed}'))
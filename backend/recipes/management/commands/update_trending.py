@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from recipes.trending import rebuild_ranking
+
+
+class Command(BaseCommand):
+    help = 'Пересчет рейтинга популярных рецептов (запускать по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Окно рейтинга в днях')
+        parser.add_argument(
+            '--limit', type=int,
+            help='Сколько рецептов оставить в рейтинге')
+
+    def handle(self, *args, **options):
+        count = rebuild_ranking(options['days'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлен, рецептов: {count}'))
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def copy_rows(through, list_field, model):
+    # Времени добавления в старых таблицах нет: оно выводится из id
+    # строки связи (строки добавлялись по возрастанию id), чтобы
+    # сохранить порядок списков по -created.
+    model._meta.get_field('created').auto_now_add = False
+    now = timezone.now()
+    last_id = through.objects.aggregate(last_id=Max('id'))['last_id']
+    rows = through.objects.order_by('id').values_list(
+        'id', f'{list_field}__user_id', 'recipe_id'
+    ).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for row_id, user_id, recipe_id in rows:
+        if user_id is None:
+            continue
+        batch.append(model(
+            user_id=user_id, recipe_id=recipe_id,
+            created=now - timedelta(microseconds=last_id - row_id)))
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def containers_to_rows(apps, schema_editor):
+    for old_name, new_name in (
+            ('FavoriteRecipeList', 'FavoriteRecipe'),
+            ('ShoppingCartList', 'ShoppingCart')):
+        old_model = apps.get_model('recipes', old_name)
+        copy_rows(
+            old_model.recipe.through,
+            old_model._meta.model_name,
+            apps.get_model('recipes', new_name))
+
+
+def rows_to_containers(apps, schema_editor):
+    for old_name, new_name in (
+            ('FavoriteRecipeList', 'FavoriteRecipe'),
+            ('ShoppingCartList', 'ShoppingCart')):
+        old_model = apps.get_model('recipes', old_name)
+        through = old_model.recipe.through
+        list_field = f'{old_model._meta.model_name}_id'
+        containers = {}
+        for container in old_model.objects.all():
+            containers[container.user_id] = container.id
+        batch = []
+        rows = apps.get_model('recipes', new_name).objects.order_by(
+            'created', 'id').values_list(
+            'user_id', 'recipe_id').iterator(chunk_size=BATCH_SIZE)
+        for user_id, recipe_id in rows:
+            if user_id not in containers:
+                containers[user_id] = old_model.objects.create(
+                    user_id=user_id).id
+            batch.append(through(
+                **{list_field: containers[user_id], 'recipe_id': recipe_id}))
+            if len(batch) >= BATCH_SIZE:
+                through.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        through.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_auto_20221021_1539'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='FavoriteRecipe',
+            new_name='FavoriteRecipeList',
+        ),
+        migrations.RenameModel(
+            old_name='ShoppingCart',
+            new_name='ShoppingCartList',
+        ),
+        migrations.CreateModel(
+            name='FavoriteRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')),
+                ('recipe', models.ForeignKey(db_index=False, help_text='Выберите рецепт', on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='recipes.recipe', verbose_name='Избранный рецепт')),
+                ('user', models.ForeignKey(db_index=False, help_text='Выберите пользователя', on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Избранный рецепт',
+                'verbose_name_plural': 'Избранные рецепты',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShoppingCart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')),
+                ('recipe', models.ForeignKey(db_index=False, help_text='Выберите рецепт для добавления в список покупок', on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to='recipes.recipe', verbose_name='Покупка')),
+                ('user', models.ForeignKey(db_index=False, help_text='Выберите пользователя', on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Список покупок',
+                'verbose_name_plural': 'Список покупок',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='favoriterecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_recipe'),
+        ),
+        migrations.AddIndex(
+            model_name='favoriterecipe',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favoriterecipe',
+            index=models.Index(fields=['user', '-created'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart_recipe'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shopping_cart_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', '-created'], name='shopping_cart_created_idx'),
+        ),
+        migrations.RunPython(containers_to_rows, rows_to_containers),
+        migrations.DeleteModel(
+            name='FavoriteRecipeList',
+        ),
+        migrations.DeleteModel(
+            name='ShoppingCartList',
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.15 on 2026-10-19 08:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_favorite_cart_through_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('rank', models.PositiveIntegerField(db_index=True, verbose_name='Место')),
+                ('score', models.IntegerField(verbose_name='Очки')),
+                ('favorites', models.IntegerField(verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.IntegerField(verbose_name='Добавлений в корзину')),
+            ],
+            options={
+                'verbose_name': 'Популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='Начало интервала')),
+                ('favorites', models.IntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.IntegerField(default=0, verbose_name='Добавлений в корзину')),
+                ('recipe', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Активность по рецепту',
+                'verbose_name_plural': 'Активность по рецептам',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipeactivity',
+            index=models.Index(fields=['bucket'], name='recipe_activity_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeactivity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'bucket'), name='unique_recipe_activity_bucket'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+# Поиск ингредиентов по началу названия (name__istartswith) в PostgreSQL
+# строится как UPPER(name) LIKE 'ПРЕФИКС%': нужен индекс по выражению.
+INGREDIENT_NAME_INDEX = 'ingredient_name_upper_idx'
+
+
+def create_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        'ON recipes_ingredient (UPPER(name) text_pattern_ops)')
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_shopping_cart_total'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# Поиск рецептов в админке по началу названия (name__istartswith)
+# в PostgreSQL строится как UPPER(name) LIKE 'ПРЕФИКС%'.
+RECIPE_NAME_INDEX = 'recipe_name_upper_idx'
+
+
+def create_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {RECIPE_NAME_INDEX} '
+        'ON recipes_recipe (UPPER(name) text_pattern_ops)')
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {RECIPE_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_dedup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-19 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_celebrity_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRecipeUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('similar', 'Похожие рецепты')], max_length=16, verbose_name='Пересчет')),
+                ('recipe_id', models.BigIntegerField(verbose_name='ID рецепта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата постановки в очередь')),
+            ],
+            options={
+                'verbose_name': 'Отложенный пересчет',
+                'verbose_name_plural': 'Очередь пересчетов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pendingrecipeupdate',
+            constraint=models.UniqueConstraint(fields=('kind', 'recipe_id'), name='unique_pending_recipe_update'),
+        ),
+    ]
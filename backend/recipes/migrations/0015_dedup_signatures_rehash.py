@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-19 09:52
+
+from django.db import migrations, models
+
+
+def clear_signatures(apps, schema_editor):
+    # Подписи посчитаны прежними перестановками и не сравнимы с новыми:
+    # пересчет - команда find_duplicate_recipes.
+    apps.get_model('recipes', 'RecipeBand').objects.all().delete()
+    apps.get_model('recipes', 'RecipeSignature').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_pending_recipe_update'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingrecipeupdate',
+            name='kind',
+            field=models.CharField(choices=[('similar', 'Похожие рецепты'), ('dedup', 'Поиск дубликатов')], max_length=16, verbose_name='Пересчет'),
+        ),
+        migrations.RunPython(clear_signatures, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models.signals import post_save
 from django.core.validators import (MinValueValidator, MaxValueValidator,
                                     RegexValidator)
-from django.dispatch import receiver
 
 User = get_user_model()
 
@@ -119,11 +117,23 @@ class Recipe(models.Model):
         auto_now_add=True,
         help_text='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=['-pub_date'],
+                name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx')]
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
@@ -200,64 +210,448 @@ class Subscribe(models.Model):
 
 class FavoriteRecipe(models.Model):
     """Модель избранного рецепта"""
-    user = models.OneToOneField(
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        null=True,
-        related_name='favorite_recipe',
+        db_index=False,
+        related_name='favorites',
         verbose_name='Пользователь',
         help_text='Выберите пользователя',
     )
-    recipe = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe,
-        related_name='favorite_recipe',
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='favorites',
         verbose_name='Избранный рецепт',
         help_text='Выберите рецепт',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True)
 
     class Meta:
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
+        ordering = ['-created']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favorite_recipe')]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_user_idx'),
+            models.Index(
+                fields=['user', '-created'],
+                name='favorite_user_created_idx')]
 
     def __str__(self):
-        list_ = [item['name'] for item in self.recipe.values('name')]
-        return f'Пользователь {self.user} добавил {list_} в избранные.'
-
-    @receiver(post_save, sender=User)
-    def create_favorite_recipe(
-            sender, instance, created, **kwargs):
-        if created:
-            return FavoriteRecipe.objects.create(user=instance)
+        return f'Пользователь {self.user} добавил {self.recipe} в избранные.'
 
 
 class ShoppingCart(models.Model):
     """Модель списка покупок"""
-    user = models.OneToOneField(
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
+        related_name='shopping_cart_items',
         verbose_name='Пользователь',
-        related_name='shopping_cart',
-        null=True,
         help_text='Выберите пользователя',
     )
-    recipe = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe,
-        related_name='shopping_cart',
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='shopping_cart_items',
         verbose_name='Покупка',
-        help_text='Выберите рецепты для добавления в список покупок',
+        help_text='Выберите рецепт для добавления в список покупок',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True)
 
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
-        ordering = ['-id']
+        ordering = ['-created']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_shopping_cart_recipe')]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='shopping_cart_recipe_user_idx'),
+            models.Index(
+                fields=['user', '-created'],
+                name='shopping_cart_created_idx')]
+
+    def __str__(self):
+        return (f'Пользователь {self.user} добавил {self.recipe} '
+                f'в список покупок.')
+
+
+class RecipeActivity(models.Model):
+    """Модель счетчиков добавлений рецепта за интервал времени"""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='activity',
+        verbose_name='Рецепт',
+    )
+    bucket = models.DateTimeField(
+        verbose_name='Начало интервала')
+    favorites = models.IntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0)
+    shopping_carts = models.IntegerField(
+        verbose_name='Добавлений в корзину',
+        default=0)
+
+    class Meta:
+        verbose_name = 'Активность по рецепту'
+        verbose_name_plural = 'Активность по рецептам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'bucket'],
+                name='unique_recipe_activity_bucket')]
+        indexes = [
+            models.Index(
+                fields=['bucket'],
+                name='recipe_activity_bucket_idx')]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.bucket}'
+
+
+class TrendingRecipe(models.Model):
+    """Модель рейтинга популярных рецептов"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    rank = models.PositiveIntegerField(
+        verbose_name='Место',
+        db_index=True)
+    score = models.IntegerField(
+        verbose_name='Очки')
+    favorites = models.IntegerField(
+        verbose_name='Добавлений в избранное')
+    shopping_carts = models.IntegerField(
+        verbose_name='Добавлений в корзину')
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        ordering = ['rank']
+
+    def __str__(self):
+        return f'{self.rank}. {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    """Модель ленты рецептов авторов, на которых подписан пользователь"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry')]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx')]
+
+    def __str__(self):
+        return f'{self.user_id} <- {self.recipe_id}'
+
+
+class CelebrityAuthor(models.Model):
+    """Модель авторов, рецепты которых читаются при запросе ленты.
+
+    Отметка не снимается, когда подписчиков становится меньше
+    FEED_FANOUT_MAX_FOLLOWERS: рецепты, опубликованные до этого,
+    не разложены по лентам.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+    def __str__(self):
+        return str(self.author_id)
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожих по ингредиентам рецептов"""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='similar',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Косинусная близость')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe')]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx')]
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_id}: {self.score:.3f}'
+
+
+class RecipeIndexLog(models.Model):
+    """Модель журнала изменений рецептов для индексов в памяти воркеров"""
+    recipe_id = models.BigIntegerField(
+        verbose_name='ID рецепта')
+    created = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now_add=True,
+        db_index=True)
+
+    class Meta:
+        verbose_name = 'Изменение рецепта'
+        verbose_name_plural = 'Журнал изменений рецептов'
+
+    def __str__(self):
+        return f'{self.id}: {self.recipe_id}'
+
+
+class PendingRecipeUpdate(models.Model):
+    """Модель очереди отложенных пересчетов по рецептам"""
+    SIMILAR = 'similar'
+    DEDUP = 'dedup'
+    KINDS = (
+        (SIMILAR, 'Похожие рецепты'),
+        (DEDUP, 'Поиск дубликатов'),
+    )
+
+    kind = models.CharField(
+        verbose_name='Пересчет',
+        max_length=16,
+        choices=KINDS)
+    recipe_id = models.BigIntegerField(
+        verbose_name='ID рецепта')
+    created = models.DateTimeField(
+        verbose_name='Дата постановки в очередь',
+        auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Отложенный пересчет'
+        verbose_name_plural = 'Очередь пересчетов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'recipe_id'],
+                name='unique_pending_recipe_update')]
+
+    def __str__(self):
+        return f'{self.kind}: {self.recipe_id}'
+
+
+class ShoppingCartTotal(models.Model):
+    """Модель итогового количества ингредиента в списке покупок"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='shopping_cart_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_total')]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.ingredient_id} - {self.amount}'
+
+
+class RecipeTombstone(models.Model):
+    """Модель записи об удалении для синхронизации изменений"""
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KINDS = (
+        (RECIPE, 'Рецепт удален'),
+        (FAVORITE, 'Рецепт удален из избранного'),
+        (SHOPPING_CART, 'Рецепт удален из списка покупок'),
+    )
+
+    kind = models.CharField(
+        verbose_name='Тип',
+        max_length=16,
+        choices=KINDS)
+    recipe_id = models.BigIntegerField(
+        verbose_name='ID рецепта')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    deleted = models.DateTimeField(
+        verbose_name='Дата удаления',
+        auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Запись об удалении'
+        verbose_name_plural = 'Записи об удалении'
+        indexes = [
+            models.Index(
+                fields=['kind', 'deleted'],
+                name='tombstone_kind_deleted_idx'),
+            models.Index(
+                fields=['user', 'kind', 'deleted'],
+                name='tombstone_user_kind_idx')]
+
+    def __str__(self):
+        return f'{self.kind} {self.recipe_id}'
+
+
+class RecipeSignature(models.Model):
+    """Модель MinHash-подписи рецепта для поиска дубликатов"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт',
+    )
+    signature = models.BinaryField(
+        verbose_name='MinHash-подпись')
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}'
+
+
+class RecipeBand(models.Model):
+    """Модель LSH-корзины рецепта (хэш полосы MinHash-подписи)"""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+    )
+    bucket = models.BigIntegerField(
+        verbose_name='Хэш полосы',
+        db_index=True)
+
+    class Meta:
+        verbose_name = 'Корзина рецепта'
+        verbose_name_plural = 'Корзины рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.bucket}'
+
+
+class DuplicateCandidate(models.Model):
+    """Модель вероятного дубликата рецепта"""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='duplicate_candidates',
+        verbose_name='Рецепт',
+    )
+    duplicate = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похож на рецепт',
+    )
+    similarity = models.FloatField(
+        verbose_name='Оценка сходства')
+    created = models.DateTimeField(
+        verbose_name='Дата обнаружения',
+        auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Вероятный дубликат'
+        verbose_name_plural = 'Вероятные дубликаты'
+        ordering = ['-similarity']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'duplicate'],
+                name='unique_duplicate_candidate')]
+        indexes = [
+            models.Index(
+                fields=['-similarity'],
+                name='duplicate_similarity_idx')]
 
     def __str__(self):
-        list_ = [item['name'] for item in self.recipe.values('name')]
-        return f'Пользователь {self.user} добавил {list_} в список покупок.'
-
-    @receiver(post_save, sender=User)
-    def create_shopping_cart(
-            sender, instance, created, **kwargs):
-        if created:
-            return ShoppingCart.objects.create(user=instance)
+        return f'{self.recipe_id} ~ {self.duplicate_id}: {self.similarity:.2f}'
@@ -0,0 +1,231 @@
+"""Поиск рецептов по имеющимся ингредиентам.
+
+Каждый воркер держит в памяти инвертированный индекс
+ингредиент -> строки рецептов (массивы NumPy). Изменения рецептов
+попадают в RecipeIndexLog, воркер дочитывает журнал перед поиском.
+"""
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeIndexLog, RecipeIngredient
+
+EMPTY = np.array([], dtype=np.int64)
+
+# Данные для поиска. Не изменяются после создания: обновление индекса
+# создает новое состояние, поиск работает с тем, что получил от sync().
+IndexState = namedtuple(
+    'IndexState', ('recipe_ids', 'sizes', 'ingredients', 'tags'))
+
+
+def log_recipe_change(recipe_id):
+    """Записать изменение рецепта в журнал и удалить старые записи."""
+
+    log_recipe_changes([recipe_id])
+
+
+def log_recipe_changes(recipe_ids):
+    RecipeIndexLog.objects.bulk_create(
+        RecipeIndexLog(recipe_id=recipe_id) for recipe_id in recipe_ids)
+    RecipeIndexLog.objects.filter(
+        created__lt=timezone.now() - timedelta(
+            seconds=settings.PANTRY_INDEX_LOG_TTL)).delete()
+
+
+class IngredientIndex:
+    """Инвертированный индекс ингредиент -> рецепты в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = None
+        self.log_id = 0
+        # Строка индекса -> id рецепта и число его ингредиентов
+        # (0 - строка устарела после изменения или удаления рецепта).
+        self.state = IndexState(EMPTY, EMPTY, {}, {})
+        self.base_size = 0
+        self.moved = {}
+
+    def build(self):
+        log_id = RecipeIndexLog.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        recipe_column, ingredient_column = array('q'), array('q')
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+        ).values_list('recipe_id', 'ingredient_id').iterator(
+                chunk_size=20000):
+            recipe_column.append(recipe_id)
+            ingredient_column.append(ingredient_id)
+        # Ингредиент, указанный в рецепте дважды, считается один раз.
+        pairs = np.unique(np.column_stack((
+            np.frombuffer(recipe_column, dtype=np.int64)
+            if recipe_column else EMPTY,
+            np.frombuffer(ingredient_column, dtype=np.int64)
+            if ingredient_column else EMPTY)), axis=0)
+        recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        ingredients = self.group(pairs[:, 1], rows)
+        tagged = list(Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag__slug').iterator(chunk_size=20000))
+        tag_recipes = np.array(
+            [recipe_id for recipe_id, _ in tagged], dtype=np.int64)
+        tag_rows = np.searchsorted(recipe_ids, tag_recipes)
+        known = tag_rows < len(recipe_ids)
+        known[known] = recipe_ids[tag_rows[known]] == tag_recipes[known]
+        self.state = IndexState(
+            recipe_ids, np.bincount(rows, minlength=len(recipe_ids)),
+            ingredients, self.group(
+                np.array([slug for _, slug in tagged])[known],
+                tag_rows[known]))
+        self.base_size = len(recipe_ids)
+        self.moved = {}
+        self.log_id = log_id
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def group(keys, rows):
+        """Сгруппировать строки по ключам: {ключ: массив строк}."""
+
+        if not len(keys):
+            return {}
+        order = np.argsort(keys, kind='stable')
+        keys, rows = keys[order], rows[order]
+        bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        return {
+            key.item(): group for key, group in zip(
+                keys[np.concatenate(([0], bounds))], np.split(rows, bounds))}
+
+    def find_row(self, recipe_id):
+        if recipe_id in self.moved:
+            return self.moved[recipe_id]
+        recipe_ids = self.state.recipe_ids
+        row = np.searchsorted(recipe_ids[:self.base_size], recipe_id)
+        if row < self.base_size and recipe_ids[row] == recipe_id:
+            return int(row)
+        return None
+
+    def reload(self, recipe_ids):
+        """Пометить старые строки рецептов устаревшими и добавить новые."""
+
+        ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                    'recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        tags = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                    'recipe_id', 'tag__slug'):
+            tags[recipe_id].append(slug)
+        state = self.state
+        sizes = state.sizes.copy()
+        indexes = dict(state.ingredients), dict(state.tags)
+        added_ids, added_sizes = [], []
+        for recipe_id in recipe_ids:
+            row = self.find_row(recipe_id)
+            if row is not None:
+                sizes[row] = 0
+                self.moved.pop(recipe_id, None)
+            if not ingredients[recipe_id]:
+                continue
+            row = len(sizes) + len(added_ids)
+            added_ids.append(recipe_id)
+            added_sizes.append(len(ingredients[recipe_id]))
+            self.moved[recipe_id] = row
+            for index, keys in zip(
+                    indexes, (ingredients[recipe_id], tags[recipe_id])):
+                for key in keys:
+                    index[key] = np.append(index.get(key, EMPTY), row)
+        self.state = IndexState(
+            np.append(state.recipe_ids, np.array(added_ids, dtype=np.int64)),
+            np.append(sizes, np.array(added_sizes, dtype=np.int64)),
+            *indexes)
+
+    def sync(self):
+        """Перестроить устаревший индекс или дочитать журнал изменений.
+
+        Возвращает актуальное состояние индекса.
+        """
+
+        with self.lock:
+            sizes = self.state.sizes
+            if (self.built_at is None
+                    or time.monotonic() - self.built_at
+                    > settings.PANTRY_INDEX_MAX_AGE
+                    or np.count_nonzero(sizes == 0) > len(sizes) // 4):
+                self.build()
+                return self.state
+            changes = list(RecipeIndexLog.objects.filter(
+                id__gt=self.log_id).values_list('id', 'recipe_id'))
+            if changes:
+                self.reload({recipe_id for _, recipe_id in changes})
+                self.log_id = max(log_id for log_id, _ in changes)
+            return self.state
+
+    def search(self, ingredient_ids, max_missing=0, tags=None):
+        """Вернуть SearchResults - (recipe_id, не хватает, доля имеющихся).
+
+        Сначала рецепты, для которых не хватает меньше всего ингредиентов.
+        """
+
+        state = self.sync()
+        sizes, recipe_ids = state.sizes, state.recipe_ids
+        counts = np.zeros(len(sizes), dtype=np.int64)
+        for ingredient_id in set(ingredient_ids):
+            counts[state.ingredients.get(ingredient_id, EMPTY)] += 1
+        missing = sizes - counts
+        mask = (sizes > 0) & (counts > 0) & (missing <= max_missing)
+        if tags:
+            tagged = np.zeros(len(sizes), dtype=bool)
+            for slug in tags:
+                tagged[state.tags.get(slug, EMPTY)] = True
+            mask &= tagged
+        rows = np.flatnonzero(mask)
+        return SearchResults(
+            recipe_ids[rows], missing[rows], counts[rows] / sizes[rows])
+
+
+class SearchResults:
+    """Найденные рецепты для пагинатора: упорядочиваются и переводятся
+    в списки Python только строки запрошенной страницы."""
+
+    def __init__(self, recipe_ids, missing, coverage):
+        self.recipe_ids = recipe_ids
+        self.missing = missing
+        self.coverage = coverage
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, step = item.indices(len(self))
+        rows = self.first_rows(stop)[start:stop:step]
+        return list(zip(
+            self.recipe_ids[rows].tolist(),
+            self.missing[rows].tolist(),
+            self.coverage[rows].tolist()))
+
+    def first_rows(self, count):
+        """Строки первых count результатов по порядку."""
+
+        if count <= 0:
+            return EMPTY
+        rows = np.arange(len(self))
+        if count < len(rows):
+            # missing - целое, 1 - coverage меньше 1: порядок ключа
+            # совпадает с порядком (missing, -coverage). Сортируются только
+            # строки не дальше count-й вместе с равными ей.
+            key = self.missing + (1 - self.coverage)
+            rows = np.flatnonzero(
+                key <= np.partition(key, count - 1)[count - 1])
+        order = np.lexsort((
+            -self.recipe_ids[rows], -self.coverage[rows], self.missing[rows]))
+        return rows[order][:count]
+
+
+index = IngredientIndex()
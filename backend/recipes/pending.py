@@ -0,0 +1,42 @@
+"""Очередь отложенных пересчетов по рецептам (PendingRecipeUpdate).
+
+Сохранение и импорт рецепта только ставят его в очередь, пересчет
+выполняет команда process_pending_updates (по расписанию).
+"""
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import PendingRecipeUpdate
+
+
+def enqueue(kind, recipe_ids):
+    PendingRecipeUpdate.objects.bulk_create(
+        (PendingRecipeUpdate(kind=kind, recipe_id=recipe_id)
+         for recipe_id in recipe_ids),
+        ignore_conflicts=True)
+
+
+def process(kind, handler, batch_size=None):
+    """Передать очередь в handler(recipe_ids) пачками, вернуть число
+    обработанных рецептов.
+
+    Пачка удаляется из очереди в той же транзакции, что и пересчет:
+    при ошибке она остается в очереди, а рецепт, сохраненный во время
+    пересчета, ставится в очередь заново. Параллельные запуски
+    пропускают заблокированные строки.
+    """
+
+    batch_size = batch_size or settings.PENDING_UPDATES_BATCH_SIZE
+    total = 0
+    while True:
+        with transaction.atomic():
+            claimed = list(PendingRecipeUpdate.objects.select_for_update(
+                skip_locked=True
+            ).filter(kind=kind).order_by('id').values_list(
+                'id', 'recipe_id')[:batch_size])
+            if not claimed:
+                return total
+            PendingRecipeUpdate.objects.filter(
+                id__in=[item_id for item_id, _ in claimed]).delete()
+            handler([recipe_id for _, recipe_id in claimed])
+        total += len(claimed)
@@ -0,0 +1,209 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from recipes import (cart_totals, changes, facets, pantry, pending,
+                     timeline)
+from recipes.models import (FavoriteRecipe, PendingRecipeUpdate, Recipe,
+                            RecipeTombstone, ShoppingCart, Subscribe, Tag,
+                            User)
+from recipes.trending import record_activity, record_removal
+
+# Рецепты добавлены в избранное/корзину или удалены оттуда.
+# sender - модель списка, аргументы: user, recipe_ids, action ('add'/'remove'),
+# для 'remove' - added: {recipe_id: дата добавления в список}.
+# Отправляется один раз на всю пачку рецептов.
+recipes_list_changed = Signal()
+
+# Рецепт сохранен вместе с тегами и ингредиентами.
+# sender - Recipe, аргументы: recipe, created, previous_ingredients -
+# {ingredient_id: amount} до изменения (None, если ингредиенты не менялись).
+recipe_saved = Signal()
+
+# Пачка рецептов создана импортом (recipes.importer).
+# sender - Recipe, аргументы: recipes.
+recipes_imported = Signal()
+
+# Изменения списков, о которых recipes_list_changed уже отправлен
+# пачкой (api.views.RecipeListMixin): построчные сигналы их пропускают.
+_reported_in_batch = ContextVar('list_changes_reported', default=False)
+# Удаляемые сейчас рецепты и пользователи, ключи (модель, pk): их строки
+# в избранном и корзине удаляются каскадом.
+_deleting = ContextVar('deleting', default=frozenset())
+
+
+@contextmanager
+def list_changes_reported():
+    """Не отправлять recipes_list_changed из сигналов моделей списков."""
+
+    token = _reported_in_batch.set(True)
+    try:
+        yield
+    finally:
+        _reported_in_batch.reset(token)
+
+
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=User)
+def mark_deleting(sender, instance, **kwargs):
+    _deleting.set(_deleting.get() | {(sender, instance.pk)})
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def unmark_deleting(sender, instance, **kwargs):
+    _deleting.set(_deleting.get() - {(sender, instance.pk)})
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def list_item_added(sender, instance, created, raw=False, **kwargs):
+    """Добавление в список не через API: админка, shell, скрипты."""
+
+    if created and not raw and not _reported_in_batch.get():
+        recipes_list_changed.send(
+            sender=sender, user=instance.user,
+            recipe_ids=[instance.recipe_id], action='add')
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def list_item_removed(sender, instance, **kwargs):
+    """Удаление из списка не через API, в том числе каскадом."""
+
+    if _reported_in_batch.get():
+        return
+    deleting = _deleting.get()
+    if (Recipe, instance.recipe_id) in deleting:
+        # Итоги корзины, записи об удалении и счетчики фильтров
+        # обновляют обработчики удаления рецепта.
+        return
+    added = {instance.recipe_id: instance.created}
+    if (User, instance.user_id) in deleting:
+        # Итоги, записи об удалении и версия счетчиков пользователя
+        # удаляются вместе с ним, остается только рейтинг.
+        record_removal(sender, added)
+        return
+    recipes_list_changed.send(
+        sender=sender, user=instance.user,
+        recipe_ids=[instance.recipe_id], action='remove', added=added)
+
+
+@receiver(recipes_list_changed)
+def update_trending_counters(sender, recipe_ids, action, added=None,
+                             **kwargs):
+    if action == 'add':
+        record_activity(sender, recipe_ids)
+    else:
+        record_removal(sender, {
+            recipe_id: added[recipe_id] for recipe_id in recipe_ids})
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw=False, **kwargs):
+    # raw - загрузка фикстур и импорт: ленты обновляет загрузчик.
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(recipes_imported)
+def fan_out_imported_recipes(sender, recipes, **kwargs):
+    timeline.fan_out_many(recipes)
+
+
+@receiver(post_save, sender=Subscribe)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def prune_feed(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(recipe_saved)
+def update_similar_recipes(sender, recipe, **kwargs):
+    pending.enqueue(PendingRecipeUpdate.SIMILAR, [recipe.id])
+
+
+@receiver(recipes_imported)
+def update_similar_imported_recipes(sender, recipes, **kwargs):
+    pending.enqueue(
+        PendingRecipeUpdate.SIMILAR, [recipe.id for recipe in recipes])
+
+
+@receiver(recipe_saved)
+def find_duplicate_recipes(sender, recipe, **kwargs):
+    pending.enqueue(PendingRecipeUpdate.DEDUP, [recipe.id])
+
+
+@receiver(recipes_imported)
+def find_imported_duplicates(sender, recipes, **kwargs):
+    pending.enqueue(
+        PendingRecipeUpdate.DEDUP, [recipe.id for recipe in recipes])
+
+
+@receiver(recipe_saved)
+def log_recipe_saved(sender, recipe, **kwargs):
+    pantry.log_recipe_change(recipe.id)
+
+
+@receiver(recipes_imported)
+def log_recipes_imported(sender, recipes, **kwargs):
+    pantry.log_recipe_changes(recipe.id for recipe in recipes)
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deleted(sender, instance, **kwargs):
+    pantry.log_recipe_change(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def record_recipe_tombstone(sender, instance, **kwargs):
+    RecipeTombstone.objects.create(
+        kind=RecipeTombstone.RECIPE, recipe_id=instance.id)
+
+
+@receiver(recipes_list_changed)
+def record_list_tombstones(sender, user, recipe_ids, action, **kwargs):
+    if action == 'remove':
+        changes.record_list_removal(sender, user, recipe_ids)
+
+
+@receiver(recipes_list_changed, sender=ShoppingCart)
+def update_cart_totals(sender, user, recipe_ids, action, **kwargs):
+    cart_totals.cart_changed(
+        user.id, recipe_ids, 1 if action == 'add' else -1)
+
+
+@receiver(recipe_saved)
+def update_cart_totals_for_recipe(
+        sender, recipe, previous_ingredients=None, **kwargs):
+    if previous_ingredients is not None:
+        cart_totals.recipe_changed(
+            recipe.id, previous_ingredients,
+            dict(recipe.recipe.values_list('ingredient_id', 'amount')))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_totals(sender, instance, **kwargs):
+    cart_totals.recipe_changed(
+        instance.id,
+        dict(instance.recipe.values_list('ingredient_id', 'amount')), {})
+
+
+@receiver(recipe_saved)
+@receiver(recipes_imported)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_facets(sender, **kwargs):
+    facets.bump_version()
+
+
+@receiver(recipes_list_changed)
+def reset_user_facets(sender, user, **kwargs):
+    facets.bump_version(user.id)
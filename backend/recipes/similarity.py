@@ -0,0 +1,154 @@
+"""Похожие рецепты: косинусная близость векторов ингредиентов с весами IDF.
+
+Полный пересчет - команда build_similar_recipes (NumPy/SciPy),
+новые и измененные рецепты обновляются по одному без этих зависимостей
+командой process_pending_updates (recipes.pending).
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+
+def idf(document_frequency, total):
+    return math.log((1 + total) / (1 + document_frequency)) + 1
+
+
+def build_neighbors(top_k=None, chunk_size=None):
+    """Пересчитать соседей для всего каталога блоками по chunk_size."""
+
+    import numpy as np
+    from scipy import sparse
+
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    chunk_size = chunk_size or settings.SIMILAR_RECIPES_CHUNK_SIZE
+    pairs = np.array(
+        list(RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id').iterator(chunk_size=10000)),
+        dtype=np.int64).reshape(-1, 2)
+    SimilarRecipe.objects.exclude(
+        recipe_id__in=RecipeIngredient.objects.values('recipe_id')).delete()
+    if not len(pairs):
+        return 0
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    _, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows, columns)),
+        shape=(len(recipe_ids), columns.max(initial=-1) + 1))
+    weights = np.log(
+        (1 + len(recipe_ids)) / (1 + np.bincount(columns))) + 1
+    matrix = matrix.multiply(weights).tocsr()
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    matrix = sparse.diags(1 / norms) @ matrix
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(recipe_ids), chunk_size):
+        scores = (matrix[start:start + chunk_size] @ transposed).tocsr()
+        neighbors = []
+        for offset in range(scores.shape[0]):
+            row = start + offset
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            candidates = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            keep = candidates != row
+            candidates, values = candidates[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                candidates, values = candidates[best], values[best]
+            neighbors.extend(
+                SimilarRecipe(
+                    recipe_id=int(recipe_ids[row]),
+                    similar_id=int(recipe_ids[candidate]),
+                    score=float(value))
+                for candidate, value in zip(candidates, values))
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=[
+                int(recipe_id)
+                for recipe_id in recipe_ids[start:start + chunk_size]
+            ]).delete()
+            SimilarRecipe.objects.bulk_create(neighbors, batch_size=5000)
+    return len(recipe_ids)
+
+
+def update_neighbors(recipe_ids):
+    """Пересчитать соседей рецептов из очереди, удаленные пропускаются."""
+
+    for recipe_id in Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True):
+        update_recipe_neighbors(recipe_id)
+
+
+def update_recipe_neighbors(recipe_id):
+    """Пересчитать соседей рецепта и его место в списках соседей
+    других рецептов; затронутые списки обрезаются до top_k."""
+
+    top_k = settings.SIMILAR_RECIPES_TOP_K
+    own = set(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+    # Кандидаты - рецепты с наибольшим числом общих ингредиентов
+    # и рецепты, в списках соседей которых он уже есть.
+    candidates = set(RecipeIngredient.objects.filter(
+        ingredient_id__in=own
+    ).exclude(recipe_id=recipe_id).order_by().values('recipe_id').annotate(
+        shared=Count('id')
+    ).order_by('-shared').values_list(
+        'recipe_id', flat=True)[:settings.SIMILAR_RECIPES_MAX_CANDIDATES])
+    candidates.update(SimilarRecipe.objects.filter(
+        similar_id=recipe_id).values_list('recipe_id', flat=True))
+    vectors = defaultdict(set)
+    for candidate, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=candidates).values_list(
+                'recipe_id', 'ingredient_id'):
+        vectors[candidate].add(ingredient_id)
+    total = Recipe.objects.count()
+    frequency = dict(RecipeIngredient.objects.filter(
+        ingredient_id__in=own.union(*vectors.values())
+    ).order_by().values('ingredient_id').annotate(
+        count=Count('id')).values_list('ingredient_id', 'count'))
+    weights = {
+        ingredient_id: idf(count, total) ** 2
+        for ingredient_id, count in frequency.items()}
+
+    def norm(ingredients):
+        return math.sqrt(sum(weights[item] for item in ingredients))
+
+    own_norm = norm(own)
+    scores = {
+        candidate: sum(weights[item] for item in own & ingredients)
+        / (own_norm * norm(ingredients))
+        for candidate, ingredients in vectors.items() if own & ingredients}
+    best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            Q(recipe_id=recipe_id) | Q(similar_id=recipe_id)).delete()
+        SimilarRecipe.objects.bulk_create(
+            [SimilarRecipe(recipe_id=recipe_id, similar_id=candidate,
+                           score=score) for candidate, score in best]
+            + [SimilarRecipe(recipe_id=candidate, similar_id=recipe_id,
+                             score=score)
+               for candidate, score in scores.items()],
+            batch_size=5000)
+        trim(scores, top_k)
+
+
+def trim(recipe_ids, top_k):
+    """Оставить в списках соседей рецептов top_k лучших."""
+
+    ranked = defaultdict(list)
+    for row_id, recipe_id, score in SimilarRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list('id', 'recipe_id', 'score'):
+        ranked[recipe_id].append((score, row_id))
+    SimilarRecipe.objects.filter(id__in=[
+        row_id for rows in ranked.values()
+        for _, row_id in sorted(rows, reverse=True)[top_k:]]).delete()
+
+
+def similar_recipe_ids(recipe_id):
+    return list(SimilarRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).order_by('-score').values_list(
+        'similar_id', flat=True)[:settings.SIMILAR_RECIPES_TOP_K])
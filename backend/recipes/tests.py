@@ -0,0 +1,218 @@
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes import cart_totals, timeline
+from recipes.models import (FeedEntry, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartTotal, Subscribe, Tag)
+from users.models import User
+
+# Кэш в памяти, чтобы тесты не очищали кэш запущенных воркеров.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, password='password',
+        first_name=name, last_name=name)
+
+
+def create_recipe(author, name):
+    return Recipe.objects.create(
+        author=author, name=name, text=name, cooking_time=10)
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTests(TestCase):
+    """Лента подписок: рецепты обычных авторов раскладываются по лентам,
+    рецепты популярных (подписчиков больше FEED_FANOUT_MAX_FOLLOWERS)
+    читаются при запросе ленты."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user('reader')
+        self.author = create_user('author')
+        self.celebrity = create_user('celebrity')
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        Subscribe.objects.create(user=self.reader, author=self.celebrity)
+        Subscribe.objects.create(
+            user=create_user('fan'), author=self.celebrity)
+        # Список популярных авторов кэшируется при первой подписке.
+        cache.clear()
+
+    def feed_ids(self, user, limit=100):
+        return [recipe_id
+                for _, recipe_id in timeline.read_feed(user, limit=limit)]
+
+    def test_fan_out_for_regular_author(self):
+        recipe = create_recipe(self.author, 'regular')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, recipe_id=recipe.id).exists())
+        self.assertEqual(self.feed_ids(self.reader), [recipe.id])
+
+    def test_celebrity_recipes_merged_at_read(self):
+        regular = create_recipe(self.author, 'regular')
+        popular = create_recipe(self.celebrity, 'popular')
+        self.assertFalse(
+            FeedEntry.objects.filter(recipe_id=popular.id).exists())
+        self.assertEqual(
+            self.feed_ids(self.reader), [popular.id, regular.id])
+
+    def test_promoted_author_not_duplicated(self):
+        # Рецепт разложен до того, как автор стал популярным: он есть
+        # и в FeedEntry, и среди рецептов, читаемых при запросе.
+        recipe = create_recipe(self.author, 'before')
+        Subscribe.objects.create(
+            user=create_user('other'), author=self.author)
+        cache.clear()
+        self.assertIn(self.author.id, timeline.celebrity_authors())
+        self.assertEqual(self.feed_ids(self.reader), [recipe.id])
+
+    def test_cursor_pages_across_both_sources(self):
+        created = []
+        for number in range(5):
+            created.append(create_recipe(self.author, f'regular {number}'))
+            created.append(
+                create_recipe(self.celebrity, f'popular {number}'))
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        url, pages = '/api/recipes/feed/?limit=3', []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data['next']
+        self.assertEqual(
+            [recipe_id for page in pages for recipe_id in page],
+            [recipe.id for recipe in reversed(created)])
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+
+    def test_invalid_cursor(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/recipes/feed/?cursor=broken')
+        self.assertEqual(response.status_code, 400)
+
+    def test_prune_on_unsubscribe(self):
+        create_recipe(self.author, 'regular')
+        popular = create_recipe(self.celebrity, 'popular')
+        Subscribe.objects.filter(
+            user=self.reader, author=self.author).delete()
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.reader, author=self.author).exists())
+        self.assertEqual(self.feed_ids(self.reader), [popular.id])
+
+    def test_backfill_on_subscribe(self):
+        other = create_user('other')
+        recipe = create_recipe(other, 'old')
+        Subscribe.objects.create(user=self.reader, author=other)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, recipe_id=recipe.id).exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CartTotalsTests(TestCase):
+    """Итоги списка покупок, обновляемые приращениями, совпадают
+    с агрегатом по корзине."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('buyer')
+        self.other = create_user('other')
+        self.tag = Tag.objects.create(name='tag', slug='tag')
+        self.flour, self.egg, self.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('flour', 'egg', 'milk'))
+        self.bread = self.recipe_with(
+            'bread', {self.flour: 500, self.egg: 2})
+        self.pancakes = self.recipe_with(
+            'pancakes', {self.flour: 200, self.milk: 300})
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def recipe_with(self, name, amounts):
+        recipe = create_recipe(self.user, name)
+        recipe.tags.set([self.tag])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in amounts.items())
+        return recipe
+
+    def assert_totals_fresh(self, *users):
+        for user in users:
+            stored = dict(ShoppingCartTotal.objects.filter(
+                user=user).values_list('ingredient_id', 'amount'))
+            fresh = dict(RecipeIngredient.objects.filter(
+                recipe__shopping_cart_items__user=user
+            ).order_by().values('ingredient_id').annotate(
+                total=Sum('amount')).values_list('ingredient_id', 'total'))
+            self.assertEqual(stored, fresh)
+
+    def test_add_and_remove(self):
+        for recipe in (self.bread, self.pancakes):
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+        self.assert_totals_fresh(self.user)
+        self.assertEqual(ShoppingCartTotal.objects.get(
+            user=self.user, ingredient=self.flour).amount, 700)
+        response = self.client.delete(
+            f'/api/recipes/{self.bread.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals_fresh(self.user)
+        self.assertFalse(ShoppingCartTotal.objects.filter(
+            user=self.user, ingredient=self.egg).exists())
+
+    def test_bulk_and_model_changes(self):
+        response = self.client.post(
+            '/api/recipes/shopping_cart/bulk/',
+            {'recipes': [self.bread.id, self.pancakes.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        ShoppingCart.objects.create(user=self.other, recipe=self.bread)
+        self.assert_totals_fresh(self.user, self.other)
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/bulk/',
+            {'recipes': [self.pancakes.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        ShoppingCart.objects.filter(user=self.other).delete()
+        self.assert_totals_fresh(self.user, self.other)
+
+    def test_change_amounts(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.bread)
+        ShoppingCart.objects.create(user=self.other, recipe=self.bread)
+        ShoppingCart.objects.create(user=self.other, recipe=self.pancakes)
+        response = self.client.patch(
+            f'/api/recipes/{self.bread.id}/',
+            {'tags': [self.tag.id],
+             'ingredients': [{'id': self.flour.id, 'amount': 450},
+                             {'id': self.milk.id, 'amount': 100}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals_fresh(self.user, self.other)
+        self.assertEqual(ShoppingCartTotal.objects.get(
+            user=self.other, ingredient=self.milk).amount, 400)
+
+    def test_recipe_deleted(self):
+        ShoppingCart.objects.create(user=self.other, recipe=self.bread)
+        ShoppingCart.objects.create(user=self.other, recipe=self.pancakes)
+        self.bread.delete()
+        self.assert_totals_fresh(self.other)
+
+    def test_rebuild_for_users(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.bread)
+        ShoppingCart.objects.create(user=self.user, recipe=self.pancakes)
+        ShoppingCart.objects.create(user=self.other, recipe=self.pancakes)
+        ShoppingCartTotal.objects.filter(
+            user=self.user, ingredient=self.flour).update(amount=1)
+        ShoppingCartTotal.objects.filter(user=self.other).delete()
+        self.assertEqual(cart_totals.rebuild([self.user.id]), 1)
+        self.assert_totals_fresh(self.user)
+        self.assertFalse(
+            ShoppingCartTotal.objects.filter(user=self.other).exists())
+        self.assertEqual(cart_totals.rebuild(), 2)
+        self.assert_totals_fresh(self.user, self.other)
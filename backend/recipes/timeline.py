@@ -0,0 +1,147 @@
+import base64
+import binascii
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from recipes.models import CelebrityAuthor, FeedEntry, Recipe, Subscribe
+
+CELEBRITIES_CACHE_KEY = 'feed-celebrity-authors'
+
+
+def celebrity_authors():
+    """Авторы, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS.
+
+    Их рецепты не раскладываются по лентам, а читаются при запросе ленты.
+    Автор остается в списке (CelebrityAuthor) и после отписок, иначе
+    рецепты, опубликованные без раскладки, пропали бы из лент.
+    """
+
+    authors = cache.get(CELEBRITIES_CACHE_KEY)
+    if authors is None:
+        authors = set(CelebrityAuthor.objects.values_list(
+            'author_id', flat=True))
+        promoted = set(Subscribe.objects.order_by().values(
+            'author_id'
+        ).annotate(
+            followers=Count('id')
+        ).filter(
+            followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list('author_id', flat=True)) - authors
+        if promoted:
+            CelebrityAuthor.objects.bulk_create(
+                [CelebrityAuthor(author_id=author_id)
+                 for author_id in promoted],
+                ignore_conflicts=True)
+            authors |= promoted
+        cache.set(
+            CELEBRITIES_CACHE_KEY, authors,
+            settings.FEED_CELEBRITIES_CACHE_TTL)
+    return authors
+
+
+def fan_out(recipe):
+    """Разложить новый рецепт по лентам подписчиков автора."""
+
+    fan_out_many([recipe])
+
+
+def fan_out_many(recipes):
+    """Разложить новые рецепты по лентам: подписчики всех авторов
+    читаются одним запросом."""
+
+    celebrities = celebrity_authors()
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        if recipe.author_id not in celebrities:
+            by_author[recipe.author_id].append(recipe)
+    if not by_author:
+        return
+    followers = Subscribe.objects.filter(
+        author_id__in=by_author
+    ).values_list('author_id', 'user_id').iterator(
+        chunk_size=settings.FEED_FANOUT_BATCH_SIZE)
+    batch = []
+    for author_id, user_id in followers:
+        for recipe in by_author[author_id]:
+            batch.append(FeedEntry(
+                user_id=user_id,
+                author_id=author_id,
+                recipe_id=recipe.id,
+                pub_date=recipe.pub_date))
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту последние рецепты автора после подписки."""
+
+    if author_id in celebrity_authors():
+        return
+    recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date').values_list(
+        'id', 'pub_date')[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(
+            user_id=user_id,
+            author_id=author_id,
+            recipe_id=recipe_id,
+            pub_date=pub_date) for recipe_id, pub_date in recipes],
+        ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    """Убрать из ленты рецепты автора после отписки."""
+
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def encode_cursor(pub_date, recipe_id):
+    return base64.urlsafe_b64encode(
+        f'{pub_date.isoformat()}|{recipe_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор, для некорректного вернуть None."""
+
+    try:
+        pub_date, recipe_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(pub_date), int(recipe_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def after_cursor(cursor, id_field):
+    if cursor is None:
+        return Q()
+    pub_date, recipe_id = cursor
+    return Q(pub_date__lt=pub_date) | Q(
+        pub_date=pub_date, **{f'{id_field}__lt': recipe_id})
+
+
+def read_feed(user, cursor=None, limit=10):
+    """Вернуть [(pub_date, recipe_id)] ленты в порядке убывания даты."""
+
+    # Множество: рецепты, разложенные до того, как автор стал
+    # популярным, читаются из обоих источников.
+    entries = set(FeedEntry.objects.filter(
+        after_cursor(cursor, 'recipe_id'), user=user
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    celebrities = celebrity_authors()
+    followed = list(Subscribe.objects.filter(
+        user=user, author_id__in=celebrities
+    ).values_list('author_id', flat=True)) if celebrities else []
+    if followed:
+        entries.update(Recipe.objects.filter(
+            after_cursor(cursor, 'id'), author_id__in=followed
+        ).order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id')[:limit])
+    return sorted(entries, reverse=True)[:limit]
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from recipes.models import (FavoriteRecipe, RecipeActivity, ShoppingCart,
+                            TrendingRecipe)
+
+COUNTERS = {
+    FavoriteRecipe: 'favorites',
+    ShoppingCart: 'shopping_carts',
+}
+
+
+def bucket_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def current_bucket():
+    return bucket_of(timezone.now())
+
+
+def record_activity(list_model, recipe_ids):
+    """Учесть добавления рецептов в текущем часовом интервале."""
+
+    field = COUNTERS[list_model]
+    bucket = current_bucket()
+    RecipeActivity.objects.bulk_create(
+        [RecipeActivity(recipe_id=recipe_id, bucket=bucket)
+         for recipe_id in recipe_ids],
+        ignore_conflicts=True)
+    RecipeActivity.objects.filter(
+        recipe_id__in=recipe_ids, bucket=bucket
+    ).update(**{field: F(field) + 1})
+
+
+def record_removal(list_model, added):
+    """Вычесть удаления из интервалов, в которых рецепты были добавлены.
+
+    added - {recipe_id: дата добавления}. Интервалы старше окна рейтинга
+    уже удалены rebuild_ranking: вычитать не из чего.
+    """
+
+    field = COUNTERS[list_model]
+    by_bucket = defaultdict(list)
+    for recipe_id, created in added.items():
+        by_bucket[bucket_of(created)].append(recipe_id)
+    for bucket, recipe_ids in by_bucket.items():
+        RecipeActivity.objects.filter(
+            recipe_id__in=recipe_ids, bucket=bucket, **{f'{field}__gt': 0}
+        ).update(**{field: F(field) - 1})
+
+
+def rebuild_ranking(days=None, limit=None):
+    """Удалить устаревшие интервалы и пересчитать рейтинг.
+
+    Очки рецепта - сумма добавлений в избранное и в корзину за days дней.
+    """
+
+    days = days or settings.TRENDING_WINDOW_DAYS
+    limit = limit or settings.TRENDING_SIZE
+    with transaction.atomic():
+        RecipeActivity.objects.filter(
+            bucket__lt=timezone.now() - timedelta(days=days)).delete()
+        totals = RecipeActivity.objects.values('recipe_id').annotate(
+            favorites_sum=Sum('favorites'),
+            shopping_carts_sum=Sum('shopping_carts'),
+        ).annotate(
+            score=F('favorites_sum') + F('shopping_carts_sum'),
+        ).filter(score__gt=0).order_by('-score', '-recipe_id')[:limit]
+        ranking = [
+            TrendingRecipe(
+                recipe_id=row['recipe_id'],
+                rank=rank,
+                score=row['score'],
+                favorites=row['favorites_sum'],
+                shopping_carts=row['shopping_carts_sum'])
+            for rank, row in enumerate(totals, start=1)]
+        TrendingRecipe.objects.all().delete()
+        TrendingRecipe.objects.bulk_create(ranking)
+    return len(ranking)
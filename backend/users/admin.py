@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from foodgram.paginators import EstimatedCountPaginator
+
 User = get_user_model()
 
 
@@ -10,5 +12,7 @@ class UserAdmin(admin.ModelAdmin):
         'id', 'username', 'email',
         'first_name', 'last_name', 'date_joined',)
     search_fields = ('email', 'username', 'first_name', 'last_name')
-    list_filter = ('date_joined', 'email', 'first_name')
+    list_filter = ('date_joined',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False